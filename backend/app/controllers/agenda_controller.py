@@ -1,115 +1,153 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from datetime import date, datetime, timedelta
-from typing import Dict
+from typing import List, Literal, Optional
+import asyncio
 import logging
 
+from ..core.config import settings
 from ..repositories.horario_repository import HorarioRepository
 from ..repositories.consulta_repository import ConsultaRepository
+from ..repositories.medico_repository import MedicoRepository
+from ..repositories.registry import get_consulta_repository, get_horario_repository, get_medico_repository
 from ..infra.schedule_state import schedule_state
+from ..infra.slot_cache import slot_cache
 from ..services.event_service import enviar_evento_sse
 
 router = APIRouter(tags=["Agenda"])
 logger = logging.getLogger("agenda_controller")
 
-# mapeamento simples de nomes para weekday()
-_DIA_MAP = {
-    "segunda": 0,
-    "terca": 1,
-    "quarta": 2,
-    "quinta": 3,
-    "sexta": 4,
-    "sabado": 5,
-    "domingo": 6,
-}
+SlotStatus = Literal["disponivel", "reservado", "ocupado"]
 
+# maior intervalo (dias) montado por requisição e maior distância de hoje
+# em que ele pode começar: cada dia montado fica no slot_cache até passar
+MAX_DIAS_SLOTS = 365
 
-def _next_days(n: int = 7):
-    today = date.today()
-    for i in range(n):
-        yield today + timedelta(days=i)
+def _filtrar_medicos(
+    m_repo: MedicoRepository, medico_ids: Optional[List[str]], especialidade: Optional[str]
+) -> Optional[List[str]]:
+    """Ids pedidos, restritos à especialidade (None = todos os médicos)."""
+    if not especialidade:
+        return medico_ids
+    da_especialidade = [m.id for m in m_repo.list_by_especialidade(especialidade)]
+    if medico_ids is None:
+        return da_especialidade
+    return [m for m in medico_ids if m in da_especialidade]
 
 
 @router.get("/slots")
-async def listar_slots(days: int = 7):
+async def listar_slots(
+    response: Response,
+    days: int = 7,
+    medico_id: Optional[List[str]] = Query(None),
+    especialidade: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    status_slot: Optional[List[SlotStatus]] = Query(None, alias="status"),
+    hr_repo: HorarioRepository = Depends(get_horario_repository),
+    c_repo: ConsultaRepository = Depends(get_consulta_repository),
+    m_repo: MedicoRepository = Depends(get_medico_repository),
+):
     """Retorna um mapeamento de slots por `medico_id`.
 
     Estrutura: { medico_id: { slot_iso: status } }
-    Gera slots para os próximos `days` dias com base nos `horarios` do médico.
+    Gera slots de `start_date` (padrão: hoje) até `end_date` (padrão: `days`
+    dias), no máximo `MAX_DIAS_SLOTS` dias e começando até `MAX_DIAS_SLOTS`
+    dias depois de hoje, com base nos `horarios` do médico. Filtros opcionais: `medico_id`
+    (repetível), `especialidade` e `status` (repetível).
+    Os slots vêm do `slot_cache` (mapa por médico/dia mantido incrementalmente).
+    O header `X-Agenda-Versao` traz a versão para GET /agenda/slots/changes.
     """
-    logger.info(f"📅 Listando slots para os próximos {days} dias")
-    hr_repo = HorarioRepository()
-    c_repo = ConsultaRepository()
-
-    medicos_horarios = {}
-    # carrega todas consultas para identificar ocupados
-    consultas = c_repo.list_all()
-
-    for h in hr_repo.list_all():
-        medicos_horarios.setdefault(h.medico_id, []).append(h)
-
-    result: Dict[str, Dict[str, str]] = {}
-
-    for medico_id, horarios in medicos_horarios.items():
-        slots: Dict[str, str] = {}
-        # para cada dia no range
-        for d in _next_days(days):
-            wd = d.weekday()
-            # para cada horario do medico
-            for h in horarios:
-                target_wd = _DIA_MAP.get(h.dia_semana.lower())
-                if target_wd is None:
-                    continue
-                if target_wd != wd:
-                    continue
-
-                # Gera slots de 30 em 30 minutos entre hora_inicio e hora_fim
-                try:
-                    # Parse hora_inicio e hora_fim (formato HH:MM)
-                    hora_ini_parts = h.hora_inicio.split(":")
-                    hora_fim_parts = h.hora_fim.split(":")
-                    
-                    hora_ini = int(hora_ini_parts[0])
-                    min_ini = int(hora_ini_parts[1])
-                    hora_fim = int(hora_fim_parts[0])
-                    min_fim = int(hora_fim_parts[1])
-                    
-                    # Cria datetime inicial
-                    current = datetime(d.year, d.month, d.day, hora_ini, min_ini)
-                    fim_datetime = datetime(d.year, d.month, d.day, hora_fim, min_fim)
-                    
-                    # Gera slots de 30 em 30 minutos
-                    while current < fim_datetime:
-                        slot_iso = current.isoformat()
-                        key = f"{medico_id}:{slot_iso}"
-
-                        # estado inicial: verificar state, depois consultas
-                        estado = schedule_state.get_status(key)
-
-                        # se ainda disponível, verificar consultas já gravadas
-                        if estado == "disponivel":
-                            # marca como ocupado se existir consulta com mesmo medico e início
-                            for c in consultas:
-                                if c.medico_id == medico_id and c.inicio.isoformat() == slot_iso and c.status == "agendada":
-                                    estado = "ocupado"
-                                    break
-
-                        slots[slot_iso] = estado
-                        
-                        # Avança 30 minutos
-                        current = current + timedelta(minutes=30)
-                        
-                except Exception as e:
-                    # fallback: ignore horário inválido
-                    logger.warning(f"Erro ao processar horário {h.hora_inicio}-{h.hora_fim}: {e}")
-                    continue
-
-        result[medico_id] = slots
+    inicio = start_date or date.today()
+    fim = end_date or inicio + timedelta(days=days - 1)
+    # sem end_date, days <= 0 continua devolvendo os médicos sem slots
+    if end_date is not None and fim < inicio:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="end_date deve ser maior ou igual a start_date")
+    if (fim - inicio).days + 1 > MAX_DIAS_SLOTS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Intervalo máximo de {MAX_DIAS_SLOTS} dias")
+    if inicio > date.today() + timedelta(days=MAX_DIAS_SLOTS):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"start_date deve ser no máximo {MAX_DIAS_SLOTS} dias depois de hoje",
+        )
+    logger.info(f"📅 Listando slots de {inicio} a {fim} (médicos={medico_id}, especialidade={especialidade}, status={status_slot})")
+
+    def _montar():
+        medico_ids = _filtrar_medicos(m_repo, medico_id, especialidade)
+        slot_cache.ensure_loaded(hr_repo, c_repo)
+        # versão lida antes dos slots: no pior caso o cliente recebe de novo
+        # uma mudança que já está no mapa
+        versao = slot_cache.versao
+        return versao, slot_cache.slots(inicio, fim, medico_ids, status_slot)
+
+    versao, result = await asyncio.to_thread(_montar)
+    response.headers["X-Agenda-Versao"] = str(versao)
 
     total_slots = sum(len(slots) for slots in result.values())
     logger.info(f"✅ Gerados {total_slots} slots para {len(result)} médicos")
     return result
 
 
+@router.get("/slots/changes")
+async def mudancas_slots(
+    since: str,
+    hr_repo: HorarioRepository = Depends(get_horario_repository),
+    c_repo: ConsultaRepository = Depends(get_consulta_repository),
+):
+    """Mudanças de slots desde a versão `since` (header X-Agenda-Versao de GET /agenda/slots).
+
+    Retorna { versao, resync, changes }; com `resync` = true o log não cobre
+    mais `since` (ou a versão veio de outro worker/execução) e o cliente deve
+    baixar GET /agenda/slots de novo.
+    """
+    def _ler():
+        slot_cache.ensure_loaded(hr_repo, c_repo)
+        return slot_cache.changes(since)
+
+    result = await asyncio.to_thread(_ler)
+    logger.info(f"🔄 Mudanças de slots desde {since}: {len(result['changes'])} (resync={result['resync']})")
+    return result
+
+
+@router.get("/slots/proximos")
+async def proximos_slots(
+    especialidade: Optional[str] = None,
+    medico_id: Optional[List[str]] = Query(None),
+    after: Optional[datetime] = None,
+    k: int = Query(5, ge=1, le=100),
+    horizonte_dias: int = Query(90, ge=1, le=MAX_DIAS_SLOTS),
+    hr_repo: HorarioRepository = Depends(get_horario_repository),
+    c_repo: ConsultaRepository = Depends(get_consulta_repository),
+    m_repo: MedicoRepository = Depends(get_medico_repository),
+):
+    """Os `k` primeiros slots disponíveis a partir de `after` (padrão: agora).
+    `after` com fuso (ex.: `Z`) é convertido para o horário local do servidor
+    e pode estar no máximo `MAX_DIAS_SLOTS` dias depois de hoje.
+
+    Filtra por `especialidade` e/ou `medico_id` (repetível); sem filtros,
+    considera todos os médicos. Retorna [{ medico_id, slot }] em ordem de horário.
+    """
+    inicio = after or datetime.now()
+    if inicio.tzinfo is not None:
+        # slots são horários locais sem fuso: converte para o horário local
+        inicio = inicio.astimezone().replace(tzinfo=None)
+    if inicio.date() > date.today() + timedelta(days=MAX_DIAS_SLOTS):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"after deve ser no máximo {MAX_DIAS_SLOTS} dias depois de hoje",
+        )
+    logger.info(f"🔎 Buscando {k} próximos slots a partir de {inicio} (especialidade={especialidade}, médicos={medico_id})")
+
+    def _buscar():
+        medico_ids = _filtrar_medicos(m_repo, medico_id, especialidade)
+        slot_cache.ensure_loaded(hr_repo, c_repo)
+        return slot_cache.next_available(medico_ids, inicio, k, horizonte_dias)
+
+    encontrados = await asyncio.to_thread(_buscar)
+
+    logger.info(f"✅ Encontrados {len(encontrados)} slots disponíveis")
+    return [{"medico_id": m, "slot": slot.isoformat()} for slot, m in encontrados]
+
+
 @router.post("/reservar")
 async def reservar_slot(payload: dict):
     """Reserva (bloqueia) um slot para um médico.
@@ -124,16 +162,15 @@ async def reservar_slot(payload: dict):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="medico_id e slot são obrigatórios")
 
     key = f"{medico_id}:{slot}"
-    if schedule_state.get_status(key) != "disponivel":
+    # verificação e reserva atômicas: só um pedido simultâneo vence
+    if not schedule_state.try_transition(key, "disponivel", "reservado"):
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Horário reservado ou ocupado")
 
-    schedule_state.set_status(key, "reservado")
-
     # publica evento SSE para notificar subscribers (slot sem prefixo)
     await enviar_evento_sse("horario_reservado", {"slot": slot, "medico_id": medico_id})
     logger.info(f"✅ Slot reservado com sucesso: {slot} - Médico: {medico_id}")
 
-    return {"status": "reservado", "slot": slot, "medico_id": medico_id}
+    return {"status": "reservado", "slot": slot, "medico_id": medico_id, "expira_em": settings.RESERVA_TTL_SEGUNDOS or None}
 
 
 @router.post("/liberar")
@@ -150,16 +187,14 @@ async def liberar_slot(payload: dict):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="medico_id e slot são obrigatórios")
 
     key = f"{medico_id}:{slot}"
-    current_status = schedule_state.get_status(key)
-    
+
     # Só libera se estiver reservado (não libera se já está ocupado com consulta confirmada)
-    if current_status == "reservado":
-        schedule_state.set_status(key, "disponivel")
+    if schedule_state.try_transition(key, "reservado", "disponivel"):
         # publica evento SSE para notificar subscribers
         await enviar_evento_sse("horario_liberado", {"slot": slot, "medico_id": medico_id})
         logger.info(f"✅ Slot liberado com sucesso: {slot}")
         return {"status": "liberado", "slot": slot, "medico_id": medico_id}
-    elif current_status == "ocupado":
+    elif schedule_state.get_status(key) == "ocupado":
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Horário já está ocupado com consulta confirmada")
     else:
         # Já está disponível, retorna sucesso
@@ -4,6 +4,10 @@ import logging
 
 from ..schemas.consulta_schema import ConsultaCreate, ConsultaOut, ConsultaUpdate
 from ..services.consulta_service import ConsultaService
+from ..repositories.consulta_repository import ConsultaRepository
+from ..repositories.medico_repository import MedicoRepository
+from ..repositories.paciente_repository import PacienteRepository
+from ..repositories.registry import get_consulta_repository, get_medico_repository, get_paciente_repository
 from ..services.task_service import TaskService
 from ..infra.schedule_state import schedule_state
 
@@ -12,8 +16,12 @@ logger = logging.getLogger("consulta_controller")
 router = APIRouter()
 
 
-def get_service() -> ConsultaService:
-    return ConsultaService()
+def get_service(
+    repo: ConsultaRepository = Depends(get_consulta_repository),
+    paciente_repo: PacienteRepository = Depends(get_paciente_repository),
+    medico_repo: MedicoRepository = Depends(get_medico_repository),
+) -> ConsultaService:
+    return ConsultaService(repo, paciente_repo, medico_repo)
 
 #crudzin dos manos
 @router.get("/", response_model=List[ConsultaOut])
@@ -71,16 +79,11 @@ async def agendar_async(payload: ConsultaCreate):
 
     # Aceita tanto "disponivel" quanto "reservado" para agendar
     # Rejeita apenas se já estiver "ocupado"
-    current_status = schedule_state.get_status(slot_key)
-    logger.info(f"🔍 Status atual do slot {slot_key}: {current_status}")
-    if current_status == "ocupado":
+    # (verifica e marca como "reservado" numa única operação atômica)
+    if not schedule_state.try_transition(slot_key, ("disponivel", "reservado"), "reservado"):
         logger.warning(f"❌ Tentativa de agendar horário já ocupado: {slot_key}")
         raise HTTPException(409, detail="Horário já está ocupado.")
-
-    # Marcar como reservado (se ainda não estiver)
-    if current_status == "disponivel":
-        schedule_state.set_status(slot_key, "reservado")
-        logger.info(f"🔒 Slot marcado como reservado: {slot_key}")
+    logger.info(f"🔒 Slot marcado como reservado: {slot_key}")
 
     # Enfileirar a tarefa (serializa datetime para string JSON)
     task_id = TaskService().enqueue_agendamento_consulta(payload.model_dump(mode='json'))
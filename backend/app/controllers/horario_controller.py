@@ -4,13 +4,15 @@ import logging
 
 from ..schemas.horario_schema import HorarioCreate, HorarioUpdate, HorarioOut
 from ..services.horario_service import HorarioService
+from ..repositories.horario_repository import HorarioRepository
+from ..repositories.registry import get_horario_repository
 
 logger = logging.getLogger("horario_controller")
 
 router = APIRouter()
 
-def get_service() -> HorarioService:
-	return HorarioService()
+def get_service(repo: HorarioRepository = Depends(get_horario_repository)) -> HorarioService:
+	return HorarioService(repo)
 
 # Listar todos os horários
 @router.get("/", response_model=List[HorarioOut])
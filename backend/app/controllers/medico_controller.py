@@ -4,14 +4,16 @@ import logging
 
 from ..schemas.medico_schema import MedicoCreate, MedicoUpdate, MedicoOut
 from ..services.medico_service import MedicoService
+from ..repositories.medico_repository import MedicoRepository
+from ..repositories.registry import get_medico_repository
 
 logger = logging.getLogger("medico_controller")
 
 router = APIRouter()
 
 
-def get_service() -> MedicoService:
-    return MedicoService()
+def get_service(repo: MedicoRepository = Depends(get_medico_repository)) -> MedicoService:
+    return MedicoService(repo)
 
 
 @router.get("/", response_model=List[MedicoOut])
@@ -5,15 +5,19 @@ import logging
 
 from ..schemas.paciente_schema import PacienteCreate, PacienteOut, PacienteUpdate
 from ..services.paciente_service import PacienteService
+from ..repositories.paciente_repository import PacienteRepository
+from ..repositories.registry import get_paciente_repository
 
 logger = logging.getLogger("paciente_controller")
 
 router = APIRouter()
 
 
-def get_paciente_service() -> PacienteService:
-    # ponto único para injeção de dependência (poderia ser mais elaborado depois)
-    return PacienteService()
+def get_paciente_service(
+    repository: PacienteRepository = Depends(get_paciente_repository),
+) -> PacienteService:
+    # ponto único para injeção de dependência (repositório compartilhado)
+    return PacienteService(repository)
 
 
 @router.get("/", response_model=List[PacienteOut])
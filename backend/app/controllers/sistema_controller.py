@@ -1,9 +1,13 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Header
 from fastapi.responses import StreamingResponse
+from typing import Optional
 import asyncio
 
 from ..services.log_service import LogService
-from ..infra.sse import sse_broker
+from ..infra.sse import TOPIC_AGENDA, TOPIC_LOGS, formatar, formatar_lote, sse_broker
+from ..infra.file_storage import cache_stats
+from ..infra import lock_metrics
+from ..core.config import settings
 
 router = APIRouter(tags=["Sistema"])
 
@@ -16,33 +20,72 @@ async def obter_logs():
     return {"logs": linhas}
 
 
-@router.get("/logs/stream")
-async def stream_logs():
-    async def event_stream():
-        queue = sse_broker.add_subscriber()
-        try:
-            while True:
-                msg = await queue.get()
-                yield f"data: {msg}\n\n"
-        except asyncio.CancelledError:
-            pass
-        finally:
-            sse_broker.remove_subscriber(queue)
+@router.get("/cache")
+async def obter_cache():
+    # hits/misses do cache em memória dos arquivos JSON
+    return {"arquivos": cache_stats()}
+
+
+@router.get("/locks")
+async def obter_locks(reset: bool = False):
+    # espera/posse por lock, do mais disputado para o menos (LOCK_METRICS=true)
+    dados = lock_metrics.snapshot()
+    if reset:
+        lock_metrics.reset()
+    return {"habilitado": settings.LOCK_METRICS, "locks": dados}
+
+
+@router.get("/sse")
+async def obter_sse():
+    # filas dos assinantes SSE: entregues, descartadas, profundidade
+    return sse_broker.stats()
 
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+async def _event_stream(topic: str, filtros: Optional[dict], last_event_id: Optional[str]):
+    # header Last-Event-ID (reconexão automática do EventSource) ou query
+    # ?last_event_id= (quando o cliente recria o EventSource)
+    queue = sse_broker.add_subscriber(topic, filtros, last_event_id or None)
+    janela = settings.SSE_LOTE_MS / 1000
+    try:
+        while True:
+            try:
+                if janela > 0:
+                    # modo lote: um frame por janela, sem eventos de slot superados
+                    lote = await asyncio.wait_for(queue.get_lote(janela), settings.SSE_HEARTBEAT_SEGUNDOS + janela)
+                    frame = formatar_lote(lote) if lote is not None else None
+                else:
+                    evento = await asyncio.wait_for(queue.get(), settings.SSE_HEARTBEAT_SEGUNDOS)
+                    frame = formatar(evento) if evento is not None else None
+            except asyncio.TimeoutError:
+                # comentário SSE: mantém a conexão viva em proxies
+                yield ": ping\n\n"
+                continue
+            if frame is None:
+                break  # assinante lento desconectado pelo broker
+            yield frame
+    except asyncio.CancelledError:
+        pass
+    finally:
+        sse_broker.remove_subscriber(queue)
+
+
+@router.get("/logs/stream")
+async def stream_logs(
+    last_event_id: Optional[str] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
+    ultimo = last_event_id_header or last_event_id
+    return StreamingResponse(_event_stream(TOPIC_LOGS, None, ultimo), media_type="text/event-stream")
 
 
 @router.get("/agenda/stream")
-async def stream_agenda():
-    async def event_stream():
-        queue = sse_broker.add_subscriber()
-        try:
-            while True:
-                msg = await queue.get()
-                yield f"data: {msg}\n\n"
-        except asyncio.CancelledError:
-            pass
-        finally:
-            sse_broker.remove_subscriber(queue)
-
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
+async def stream_agenda(
+    medico_id: Optional[str] = None,
+    last_event_id: Optional[str] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
+    # com medico_id, só chegam eventos desse médico (e os gerais, sem médico);
+    # com Last-Event-ID (reconexão), chegam antes os eventos perdidos
+    filtros = {"medico_id": medico_id} if medico_id else None
+    ultimo = last_event_id_header or last_event_id
+    return StreamingResponse(_event_stream(TOPIC_AGENDA, filtros, ultimo), media_type="text/event-stream")
@@ -1,6 +1,17 @@
 from pathlib import Path
+from typing import Literal
 from pydantic_settings import BaseSettings
 
+# diretórios já garantidos: evita um mkdir por acesso às propriedades
+_created_dirs: set = set()
+
+
+def _ensure_dir(path: Path) -> Path:
+    if path not in _created_dirs:
+        path.mkdir(parents=True, exist_ok=True)
+        _created_dirs.add(path)
+    return path
+
 
 class Settings(BaseSettings):
     APP_NAME: str = "AgendamentoMedico"
@@ -8,29 +19,74 @@ class Settings(BaseSettings):
     # Diretório base DO BACKEND (não o home do usuário)
     BASE_DIR: Path = Path(__file__).resolve().parents[1]
 
+    # Engine de persistência dos repositórios:
+    # - "json": arquivo JSON reescrito a cada escrita
+    # - "journal": snapshot JSON + journal append-only (.journal.jsonl)
+    # - "sqlite": banco SQLite em WAL (migra os JSON na primeira abertura)
+    STORAGE_ENGINE: Literal["json", "journal", "sqlite"] = "json"
+    # tamanho do journal (bytes) que dispara a compactação
+    JOURNAL_COMPACT_BYTES: int = 1_000_000
+    # conexões SQLite mantidas abertas no pool
+    SQLITE_POOL_SIZE: int = 4
+
+    # onde fica o status dos slots (reservado/ocupado):
+    # - "memory": em memória, por processo; com um segundo processo no mesmo
+    #   BASE_DIR o startup falha (um worker só)
+    # - "sqlite": banco SQLite compartilhado entre workers (uvicorn --workers N).
+    #   Consultas, índice de conflitos e cache de slots se revalidam pela
+    #   versão do storage, mas os streams SSE e o log de /agenda/slots/changes
+    #   continuam por worker: um cliente só recebe eventos do worker em que
+    #   está conectado (use afinidade de sessão no balanceador)
+    SCHEDULE_STATE_BACKEND: Literal["memory", "sqlite"] = "memory"
+
+    # intervalo (s) entre snapshots do schedule_state em memória; 0 = só no shutdown
+    SCHEDULE_SNAPSHOT_SEGUNDOS: int = 60
+
+    # mudanças de slot guardadas para GET /agenda/slots/changes
+    SLOT_CHANGELOG_TAMANHO: int = 1000
+
+    # segundos até uma reserva ("reservado") sem consulta expirar; 0 desliga
+    RESERVA_TTL_SEGUNDOS: int = 300
+
+    # mensagens pendentes por assinante SSE e o que fazer com a fila cheia:
+    # "drop_oldest" (descarta a mais antiga), "coalesce" (troca a do mesmo
+    # slot) ou "disconnect" (encerra o stream do assinante lento)
+    SSE_FILA_MAX: int = 1000
+    SSE_POLITICA_LENTO: Literal["drop_oldest", "coalesce", "disconnect"] = "drop_oldest"
+    # eventos guardados por tópico para reconexões com Last-Event-ID
+    SSE_REPLAY_TAMANHO: int = 500
+    # intervalo (s) dos comentários de heartbeat em streams ociosos
+    SSE_HEARTBEAT_SEGUNDOS: float = 15
+    # janela (ms) para juntar eventos num único frame SSE; 0 desliga
+    SSE_LOTE_MS: int = 0
+
+    # mede espera/posse dos locks (file_lock, storages, schedule_state);
+    # leitura em GET /sistema/locks
+    LOCK_METRICS: bool = False
+
     @property
     def data_dir(self) -> Path:
-        path = self.BASE_DIR / "banco"
-        path.mkdir(parents=True, exist_ok=True)
-        return path
+        return _ensure_dir(self.BASE_DIR / "banco")
+
+    @property
+    def sqlite_path(self) -> Path:
+        return self.data_dir / "agendamento.db"
+
+    @property
+    def schedule_state_path(self) -> Path:
+        return self.data_dir / "schedule_state.db"
 
     @property
     def logs_dir(self) -> Path:
-        path = self.BASE_DIR / "logs"
-        path.mkdir(parents=True, exist_ok=True)
-        return path
+        return _ensure_dir(self.BASE_DIR / "logs")
 
     @property
     def reports_dir(self) -> Path:
-        path = self.BASE_DIR / "reports"
-        path.mkdir(parents=True, exist_ok=True)
-        return path
+        return _ensure_dir(self.BASE_DIR / "reports")
 
     @property
     def temp_dir(self) -> Path:
-        path = self.BASE_DIR / "temp"
-        path.mkdir(parents=True, exist_ok=True)
-        return path
+        return _ensure_dir(self.BASE_DIR / "temp")
 
 
 settings = Settings()
@@ -1,12 +1,12 @@
 import logging
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
-from queue import Queue
+from queue import Empty, Full, Queue
 from typing import Optional
 
 
 from ..core.config import settings
-from ..infra.sse import sse_broker
+from ..infra.sse import TOPIC_LOGS, sse_broker
 
 # FILA GLOBAL DE LOG PARA STREAMING NO FRONTEND
 LOG_QUEUE: "Queue[str]" = Queue(maxsize=5000)
@@ -20,16 +20,22 @@ class QueueLogHandler(logging.Handler):
     def emit(self, record: logging.LogRecord) -> None:
         try:
             msg = self.format(record)
-            LOG_QUEUE.put(msg)
-            # Publica no broker SSE para streaming em tempo real
-            import asyncio
             try:
-                loop = asyncio.get_running_loop()
-                # Se já houver loop rodando, cria task
-                loop.create_task(sse_broker.publish(msg))
-            except RuntimeError:
-                # Se não houver loop, ignora (ex: log fora do contexto async)
-                pass
+                LOG_QUEUE.put_nowait(msg)
+            except Full:
+                # ninguém consumindo: descarta a mais antiga em vez de travar
+                # a thread que está logando
+                try:
+                    LOG_QUEUE.get_nowait()
+                except Empty:
+                    pass
+                LOG_QUEUE.put_nowait(msg)
+            # Publica no broker SSE para streaming em tempo real
+            # (só se alguém estiver assistindo o tópico de logs ou se houver
+            # histórico para reconexões); logs de qualquer thread passam pela
+            # ponte thread-safe do broker
+            if sse_broker.replay > 0 or sse_broker.has_subscribers(TOPIC_LOGS):
+                sse_broker.publish_threadsafe(TOPIC_LOGS, msg)
         except Exception:
             pass  # nunca quebra o sistema
 
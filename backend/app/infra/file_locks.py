@@ -2,34 +2,133 @@ import contextlib
 import platform
 import threading
 from pathlib import Path
-from typing import Iterator
+from typing import IO, Callable, ContextManager, Dict, Iterator, List, Optional
+
+from .lock_metrics import instrumented
+
+
+class RWLock:
+    """
+    Lock leitores/escritor em memória (por processo):
+
+    - Vários leitores podem segurar o lock ao mesmo tempo.
+    - Escritor é exclusivo e tem preferência: com um escritor na fila,
+      novos leitores esperam (evita starvation de escrita).
+    - Reentrante na mesma thread (leitura dentro de leitura, qualquer
+      coisa dentro de escrita). Promover leitura para escrita não é
+      suportado e gera RuntimeError em vez de deadlock.
+
+    Com `name`, espera/posse entram nas métricas de lock (lock_metrics).
+    """
+
+    def __init__(self, name: Optional[str] = None) -> None:
+        self.name = name
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None  # ident da thread escritora
+        self._write_depth = 0
+        self._waiting_writers = 0
+        self._local = threading.local()
+
+    def _stack(self) -> List[str]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def acquire_read(self) -> None:
+        me = threading.get_ident()
+        stack = self._stack()
+        with self._cond:
+            if self._writer == me:
+                # leitura dentro de escrita: conta como escrita aninhada
+                self._write_depth += 1
+                stack.append("w")
+                return
+            if "r" not in stack:
+                while self._writer is not None or self._waiting_writers:
+                    self._cond.wait()
+            self._readers += 1
+            stack.append("r")
+
+    def acquire_write(self) -> None:
+        me = threading.get_ident()
+        stack = self._stack()
+        with self._cond:
+            if self._writer == me:
+                self._write_depth += 1
+                stack.append("w")
+                return
+            if "r" in stack:
+                raise RuntimeError("RWLock: não é possível promover leitura para escrita")
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._write_depth = 1
+            stack.append("w")
+
+    def release(self) -> None:
+        stack = self._stack()
+        with self._cond:
+            if stack.pop() == "w":
+                self._write_depth -= 1
+                if self._write_depth == 0:
+                    self._writer = None
+                    self._cond.notify_all()
+            else:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def _hold(self, mode: str, acquire: Callable[[], None]) -> Iterator[None]:
+        if self.name:
+            with instrumented(f"{self.name}:{mode}", acquire, self.release):
+                yield
+            return
+        acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def read(self) -> ContextManager[None]:
+        return self._hold("read", self.acquire_read)
+
+    def write(self) -> ContextManager[None]:
+        return self._hold("write", self.acquire_write)
 
 
 # Lock global em memória para Windows (por processo)
-_windows_lock = threading.RLock()
+_windows_lock = RWLock(name="windows_lock")
 
 
 @contextlib.contextmanager
-def file_lock(path: Path) -> Iterator[None]:
+def file_lock(path: Path, shared: bool = False) -> Iterator[None]:
     """
     Lock transparente entre SOs:
 
     - Windows:
-        Usa apenas RLock (lock em memória).
+        Usa apenas RWLock (lock em memória).
         File locking real causa PermissionError em escrita simultânea,
         principalmente em pastas sincronizadas como OneDrive.
-    
+
     - Linux/macOS:
-        Usa fcntl.flock EXCLUSIVO (file lock real).
-    
-    Isso garante concorrência segura sem travar arquivos no Windows.
+        Usa fcntl.flock (file lock real): COMPARTILHADO (LOCK_SH) para
+        leitura quando `shared=True`, EXCLUSIVO (LOCK_EX) caso contrário.
+
+    Leitores rodam em paralelo; apenas escritores são exclusivos.
     """
 
     system = platform.system().lower()
 
     # --- WINDOWS ---
     if system == "windows":
-        with _windows_lock:
+        with (_windows_lock.read() if shared else _windows_lock.write()):
             yield
         return
 
@@ -43,9 +142,39 @@ def file_lock(path: Path) -> Iterator[None]:
 
     path.parent.mkdir(parents=True, exist_ok=True)
     with path.open("a+") as f:
-        # Lock exclusivo
-        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
-        try:
+        # Lock compartilhado (leitura) ou exclusivo (escrita)
+        modo = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        with instrumented(
+            f"flock[{'sh' if shared else 'ex'}]:{path}",
+            lambda: fcntl.flock(f.fileno(), modo),
+            lambda: fcntl.flock(f.fileno(), fcntl.LOCK_UN),
+        ):
             yield
-        finally:
-            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
\ No newline at end of file
+
+
+# arquivos de hold_process_lock: ficam abertos (e travados) até o processo terminar
+_process_locks: Dict[str, IO[str]] = {}
+
+
+def hold_process_lock(path: Path) -> bool:
+    """
+    Trava `path` para este processo até ele terminar (flock exclusivo, sem
+    esperar). Retorna False se outro processo já tem o lock. No Windows
+    (sem fcntl) não há como detectar e sempre retorna True.
+    """
+    key = str(path.resolve())
+    if key in _process_locks:
+        return True
+    try:
+        import fcntl  # type: ignore
+    except ImportError:
+        return True
+    path.parent.mkdir(parents=True, exist_ok=True)
+    f = path.open("a+")
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return False
+    _process_locks[key] = f
+    return True
@@ -1,9 +1,105 @@
+import contextlib
 import json
 from pathlib import Path
-from threading import RLock
-from typing import Any, Dict, List
+from threading import Lock, local
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from .file_locks import file_lock
+from ..core.config import settings
+from .file_locks import RWLock, file_lock
+
+
+# Assinatura do arquivo em disco: (mtime_ns, tamanho, inode)
+Signature = Tuple[int, int, int]
+
+
+
+class CacheEntry:
+    """
+    Versão em memória de um arquivo JSON com índices hash:
+    - by_id: id → registro
+    - by_field: campo → valor → registros (ex.: medico_id, paciente_id)
+
+    É substituída inteira a cada escrita, então os índices sempre
+    refletem o conteúdo atual. Campos não declarados são indexados
+    na primeira consulta.
+    """
+
+    def __init__(self, sig: Optional[Signature], records: List[Dict[str, Any]], fields: Iterable[str] = ()) -> None:
+        self.sig = sig
+        self.records = records
+        self.by_id: Dict[str, Dict[str, Any]] = {r["id"]: r for r in records}
+        self.by_field: Dict[str, Dict[Any, List[Dict[str, Any]]]] = {}
+        for field in fields:
+            self.index(field)
+
+    def index(self, field: str) -> Dict[Any, List[Dict[str, Any]]]:
+        idx = self.by_field.get(field)
+        if idx is None:
+            idx = {}
+            for r in self.records:
+                idx.setdefault(r.get(field), []).append(r)
+            self.by_field[field] = idx
+        return idx
+
+
+# Cache compartilhado entre todas as instâncias (um por arquivo).
+# Repositórios são criados a cada requisição, então o cache precisa
+# viver no módulo para sobreviver entre elas.
+_cache: Dict[str, CacheEntry] = {}
+_cache_stats: Dict[str, Dict[str, int]] = {}
+_cache_lock = Lock()
+
+
+class VersoesDeEscrita:
+    """
+    (versão antes, versão depois) da última escrita de cada thread, medidas
+    com o lock de escrita do storage seguro. Quem mantém estado derivado
+    (índices, caches) aplica a própria escrita e adota a versão "depois"
+    só se ainda estava na versão "antes": nada de outro processo no meio.
+    """
+
+    def __init__(self) -> None:
+        self._local = local()
+
+    def registrar(self, antes: Any, depois: Any) -> None:
+        self._local.ultima = (antes, depois)
+
+    def ultima(self) -> Tuple[Any, Any]:
+        return getattr(self._local, "ultima", (None, None))
+
+
+def file_signature(path: Path) -> Optional[Signature]:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def open_storage(file_path: Path, indexes: Tuple[str, ...] = ()):
+    """
+    Abre o storage escolhido em `settings.STORAGE_ENGINE` para o arquivo.
+    `indexes` lista os campos (além de `id`) com índice hash para find_by().
+    """
+    if settings.STORAGE_ENGINE == "journal":
+        from .journal_storage import open_journal
+        return open_journal(file_path, settings.JOURNAL_COMPACT_BYTES, indexes)
+    if settings.STORAGE_ENGINE == "sqlite":
+        from .sqlite_storage import open_sqlite
+        return open_sqlite(file_path, settings.sqlite_path, settings.SQLITE_POOL_SIZE)
+    return JsonFileStorage(file_path, indexes)
+
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    """Retorna hits/misses do cache por arquivo JSON."""
+    with _cache_lock:
+        return {
+            path: {
+                **stats,
+                "registros": len(_cache[path].records) if path in _cache else 0,
+            }
+            for path, stats in _cache_stats.items()
+        }
 
 
 class JsonFileStorage:
@@ -12,11 +108,21 @@ class JsonFileStorage:
     - Se o arquivo não existir → cria com []
     - Se o arquivo estiver vazio → reescreve []
     - Se der erro ao ler (arquivo quebrado) → corrige e retorna []
+
+    Mantém em memória a última versão lida/escrita do arquivo, reutilizada
+    enquanto (mtime_ns, tamanho, inode) não mudarem. Escritas de outros
+    processos alteram a assinatura e forçam uma nova leitura.
+    Junto com a cópia ficam índices hash por `id` e pelos campos de
+    `indexes` (get/find_by não percorrem a lista).
     """
 
-    def __init__(self, file_path: Path) -> None:
+    def __init__(self, file_path: Path, indexes: Tuple[str, ...] = ()) -> None:
         self.file_path = file_path
-        self._lock = RLock()
+        self.indexes = indexes
+        # leitores em paralelo, escritores exclusivos
+        self._lock = RWLock(name=f"storage:{file_path}")
+        self._key = str(file_path.resolve())
+        self._escritas = VersoesDeEscrita()
 
         # garante diretório
         file_path.parent.mkdir(parents=True, exist_ok=True)
@@ -25,27 +131,156 @@ class JsonFileStorage:
         if not file_path.exists() or file_path.stat().st_size == 0:
             file_path.write_text("[]", encoding="utf-8")
 
-    def _read_json(self) -> List[Dict[str, Any]]:
-        with file_lock(self.file_path), self._lock:
-            try:
-                with self.file_path.open("r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    if isinstance(data, list):
-                        return data
+    # ---------------------------------
+    # Cache em memória
+    # ---------------------------------
+    def _cache_get(self, sig: Optional[Signature]) -> Optional[CacheEntry]:
+        with _cache_lock:
+            stats = _cache_stats.setdefault(self._key, {"hits": 0, "misses": 0})
+            entry = _cache.get(self._key)
+            if sig is not None and entry is not None and entry.sig == sig:
+                stats["hits"] += 1
+                return entry
+            stats["misses"] += 1
+            return None
+
+    def _cache_put(self, data: List[Dict[str, Any]]) -> CacheEntry:
+        sig = file_signature(self.file_path)
+        # índices montados fora do lock global
+        entry = CacheEntry(sig, list(data), self.indexes)
+        with _cache_lock:
+            if sig is None:
+                _cache.pop(self._key, None)
+            else:
+                _cache[self._key] = entry
+        return entry
+
+    @property
+    def cache_stats(self) -> Dict[str, int]:
+        with _cache_lock:
+            return dict(_cache_stats.get(self._key, {"hits": 0, "misses": 0}))
+
+    # ---------------------------------
+    # Leitura / escrita
+    # ---------------------------------
+    def _entry(self) -> Optional[CacheEntry]:
+        # chamar com file_lock e self._lock adquiridos (leitura ou escrita).
+        # Retorna None se o arquivo estiver inválido.
+        cached = self._cache_get(file_signature(self.file_path))
+        if cached is not None:
+            return cached
+        try:
+            with self.file_path.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+                if not isinstance(data, list):
                     # Corrige caso o JSON não seja uma lista
-                    return []
-            except Exception:
-                # corrige arquivo inválido
-                self._write_json([])
-                return []
+                    data = []
+        except Exception:
+            return None
+        return self._cache_put(data)
+
+    def _load(self) -> Optional[List[Dict[str, Any]]]:
+        entry = self._entry()
+        # cópia rasa: quem chama pode filtrar/adicionar sem afetar o cache
+        return list(entry.records) if entry is not None else None
+
+    def _load_for_write(self) -> List[Dict[str, Any]]:
+        # chamar com locks EXCLUSIVOS: arquivo inválido vira []
+        data = self._load()
+        if data is None:
+            self._dump([])
+            return []
+        return data
+
+    def _dump(self, data: List[Dict[str, Any]]) -> None:
+        # chamar com file_lock e self._lock EXCLUSIVOS
+        with self.file_path.open("w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        # write-through: a próxima leitura não precisa reabrir o arquivo
+        self._cache_put(data)
+
+    @contextlib.contextmanager
+    def _escrita(self) -> Iterator[None]:
+        # locks EXCLUSIVOS + versões antes/depois da escrita (last_write_versions)
+        with file_lock(self.file_path), self._lock.write():
+            antes = file_signature(self.file_path)
+            yield
+            self._escritas.registrar(antes, file_signature(self.file_path))
+
+    def _read_entry(self) -> CacheEntry:
+        # leitura com lock compartilhado: leitores não se bloqueiam
+        with file_lock(self.file_path, shared=True), self._lock.read():
+            entry = self._entry()
+        if entry is not None:
+            return entry
+        # arquivo inválido: corrige com lock exclusivo
+        with file_lock(self.file_path), self._lock.write():
+            self._load_for_write()
+            return self._entry() or CacheEntry(None, [], self.indexes)
+
+    def _read_json(self) -> List[Dict[str, Any]]:
+        return list(self._read_entry().records)
 
     def _write_json(self, data: List[Dict[str, Any]]) -> None:
-        with file_lock(self.file_path), self._lock:
-            with self.file_path.open("w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+        with self._escrita():
+            self._dump(data)
+
+    def version(self) -> Optional[Signature]:
+        """Muda sempre que o arquivo muda (escrita deste ou de outro processo)."""
+        return file_signature(self.file_path)
+
+    def last_write_versions(self) -> Tuple[Any, Any]:
+        """(versão antes, versão depois) da última escrita desta thread."""
+        return self._escritas.ultima()
 
     def list_all(self) -> List[Dict[str, Any]]:
         return self._read_json()
 
+    def get(self, record_id: str) -> Optional[Dict[str, Any]]:
+        return self._read_entry().by_id.get(record_id)
+
+    def find_by(self, field: str, value: Any) -> List[Dict[str, Any]]:
+        """Registros com `field == value`, via índice hash."""
+        return list(self._read_entry().index(field).get(value, ()))
+
     def save_all(self, records: List[Dict[str, Any]]) -> None:
         self._write_json(records)
+
+    def upsert(self, record: Dict[str, Any]) -> None:
+        """Substitui (ou adiciona) o registro com o mesmo `id`."""
+        with self._escrita():
+            registros = [r for r in self._load_for_write() if r["id"] != record["id"]]
+            registros.append(record)
+            self._dump(registros)
+
+    def delete(self, record_id: str) -> bool:
+        with self._escrita():
+            registros = self._load_for_write()
+            novos = [r for r in registros if r["id"] != record_id]
+            if len(novos) == len(registros):
+                return False
+            self._dump(novos)
+            return True
+
+    def upsert_many(self, records: List[Dict[str, Any]]) -> None:
+        """Aplica vários upserts com um único lock, leitura e escrita."""
+        if not records:
+            return
+        novos = {r["id"]: r for r in records}
+        with self._escrita():
+            registros = [r for r in self._load_for_write() if r["id"] not in novos]
+            registros.extend(novos.values())
+            self._dump(registros)
+
+    def delete_many(self, record_ids: List[str]) -> int:
+        """Remove vários registros de uma vez; retorna quantos existiam."""
+        ids = set(record_ids)
+        if not ids:
+            return 0
+        with self._escrita():
+            registros = self._load_for_write()
+            novos = [r for r in registros if r["id"] not in ids]
+            removidos = len(registros) - len(novos)
+            if removidos:
+                self._dump(novos)
+            return removidos
@@ -0,0 +1,110 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# (inicio, fim, id)
+Interval = Tuple[datetime, datetime, str]
+
+
+class IntervalIndex:
+    """
+    Intervalos [inicio, fim) agrupados por chave (ex.: medico_id),
+    mantidos em listas ordenadas por início.
+
+    Para saber se [inicio, fim) sobrepõe algum intervalo da chave basta
+    olhar os que começam em (inicio - maior_duração, fim): duas buscas
+    binárias e uma janela pequena, em vez de percorrer todo o histórico.
+    """
+
+    def __init__(self) -> None:
+        self._starts: Dict[str, List[datetime]] = {}
+        self._items: Dict[str, List[Interval]] = {}
+        self._where: Dict[str, Tuple[str, datetime]] = {}  # id → (chave, início)
+        self._max_len: Dict[str, timedelta] = {}
+        self._lock = Lock()
+
+    def load(self, entries: Iterable[Tuple[str, str, datetime, datetime]]) -> None:
+        """Reconstrói o índice a partir de (chave, id, inicio, fim)."""
+        with self._lock:
+            self._starts.clear()
+            self._items.clear()
+            self._where.clear()
+            self._max_len.clear()
+            for key, item_id, inicio, fim in entries:
+                self._items.setdefault(key, []).append((inicio, fim, item_id))
+                self._where[item_id] = (key, inicio)
+                self._max_len[key] = max(self._max_len.get(key, timedelta(0)), fim - inicio)
+            for key, items in self._items.items():
+                items.sort()
+                self._starts[key] = [i[0] for i in items]
+
+    def load_key(self, key: str, entries: Iterable[Tuple[str, datetime, datetime]]) -> None:
+        """Substitui os intervalos de uma chave por (id, inicio, fim)."""
+        with self._lock:
+            for _, _, item_id in self._items.pop(key, ()):
+                self._where.pop(item_id, None)
+            items = sorted((inicio, fim, item_id) for item_id, inicio, fim in entries)
+            for inicio, _, item_id in items:
+                antigo = self._where.get(item_id)
+                if antigo is not None and antigo[0] != key:
+                    # mudou de chave (ex.: consulta trocada de médico)
+                    self._remove(item_id)
+                self._where[item_id] = (key, inicio)
+            self._items[key] = items
+            self._starts[key] = [i[0] for i in items]
+            self._max_len[key] = max((fim - inicio for inicio, fim, _ in items), default=timedelta(0))
+
+    def add(self, key: str, item_id: str, inicio: datetime, fim: datetime) -> None:
+        with self._lock:
+            self._remove(item_id)
+            items = self._items.setdefault(key, [])
+            starts = self._starts.setdefault(key, [])
+            pos = bisect_right(starts, inicio)
+            starts.insert(pos, inicio)
+            items.insert(pos, (inicio, fim, item_id))
+            self._where[item_id] = (key, inicio)
+            self._max_len[key] = max(self._max_len.get(key, timedelta(0)), fim - inicio)
+
+    def remove(self, item_id: str) -> bool:
+        with self._lock:
+            return self._remove(item_id)
+
+    def _remove(self, item_id: str) -> bool:
+        onde = self._where.pop(item_id, None)
+        if onde is None:
+            return False
+        key, inicio = onde
+        starts, items = self._starts[key], self._items[key]
+        pos = bisect_left(starts, inicio)
+        while pos < len(items) and items[pos][0] == inicio:
+            if items[pos][2] == item_id:
+                del starts[pos]
+                del items[pos]
+                return True
+            pos += 1
+        return False
+
+    def find_overlap(
+        self, key: str, inicio: datetime, fim: datetime, ignore_id: Optional[str] = None
+    ) -> Optional[Interval]:
+        """Primeiro intervalo da chave que sobrepõe [inicio, fim), se houver."""
+        with self._lock:
+            starts = self._starts.get(key)
+            if not starts:
+                return None
+            items = self._items[key]
+            # só quem começa antes de `fim` e depois de `inicio - maior duração`
+            # pode terminar depois de `inicio`
+            lo = bisect_right(starts, inicio - self._max_len[key])
+            hi = bisect_left(starts, fim)
+            for pos in range(lo, hi):
+                c_inicio, c_fim, c_id = items[pos]
+                if c_id == ignore_id:
+                    continue
+                if inicio < c_fim and fim > c_inicio:
+                    return items[pos]
+            return None
+
+    def __len__(self) -> int:
+        return len(self._where)
@@ -0,0 +1,286 @@
+import contextlib
+import json
+import logging
+import os
+from pathlib import Path
+from threading import Lock, RLock, Thread
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .file_locks import file_lock
+from .file_storage import Signature, VersoesDeEscrita, file_signature
+from .lock_metrics import locked
+
+logger = logging.getLogger("journal_storage")
+
+
+class JournalFileStorage:
+    """
+    Armazenamento append-only (mesma interface do JsonFileStorage):
+    - <nome>.json          → snapshot (lista JSON, mesmo formato do JsonFileStorage)
+    - <nome>.journal.jsonl → uma linha por escrita:
+        {"op": "upsert", "record": {...}} ou {"op": "delete", "id": "..."}
+
+    Ao abrir, o estado é reconstruído aplicando o journal sobre o snapshot.
+    Cada escrita custa O(tamanho do registro) em vez de reescrever o arquivo.
+    Quando o journal passa de `compact_bytes`, uma thread em background grava
+    um novo snapshot e trunca o journal.
+
+    Outros processos são detectados pelo crescimento do journal (aplica só o
+    trecho novo) ou pela troca do snapshot (recarrega tudo).
+
+    O estado em memória já é indexado por `id`; os campos de `indexes`
+    ganham índices hash atualizados a cada entrada aplicada.
+    """
+
+    def __init__(
+        self, file_path: Path, compact_bytes: int = 1_000_000, indexes: Tuple[str, ...] = ()
+    ) -> None:
+        self.file_path = file_path
+        self.journal_path = file_path.with_suffix(".journal.jsonl")
+        self.compact_bytes = compact_bytes
+        self.indexes = indexes
+        self._lock = RLock()
+        self._records: Dict[str, Dict[str, Any]] = {}
+        # campo → valor → {id: registro}
+        self._by_field: Dict[str, Dict[Any, Dict[str, Dict[str, Any]]]] = {}
+        self._snapshot_sig: Optional[Signature] = None
+        self._offset = 0
+        self._compacting = False
+        self._escritas = VersoesDeEscrita()
+
+        # garante diretório e arquivos
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        if not file_path.exists() or file_path.stat().st_size == 0:
+            file_path.write_text("[]", encoding="utf-8")
+        self.journal_path.touch(exist_ok=True)
+
+        with self._locked():
+            self._reload()
+
+    @contextlib.contextmanager
+    def _locked(self, shared: bool = False) -> Iterator[None]:
+        # o lock de arquivo fica no journal: o snapshot é trocado via
+        # os.replace na compactação e mudaria de inode.
+        # Leituras usam lock compartilhado entre processos; em memória o
+        # RLock continua exclusivo porque _sync() altera self._records.
+        with file_lock(self.journal_path, shared=shared), locked(f"journal:{self.file_path}", self._lock):
+            yield
+
+    @contextlib.contextmanager
+    def _escrita(self) -> Iterator[None]:
+        # lock exclusivo, estado em dia e versões antes/depois (last_write_versions)
+        with self._locked():
+            self._sync()
+            antes = (self._snapshot_sig, self._offset)
+            yield
+            self._escritas.registrar(antes, (self._snapshot_sig, self._offset))
+
+    # ---------------------------------
+    # Reconstrução do estado
+    # ---------------------------------
+    def _reload(self) -> None:
+        self._snapshot_sig = file_signature(self.file_path)
+        try:
+            with self.file_path.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+            if not isinstance(data, list):
+                data = []
+        except Exception:
+            logger.warning("Snapshot inválido, iniciando vazio: %s", self.file_path)
+            data = []
+        self._set_records(data)
+        self._offset = 0
+        self._replay()
+
+    def _set_records(self, records: List[Dict[str, Any]]) -> None:
+        self._records = {r["id"]: r for r in records}
+        self._by_field = {field: {} for field in self.indexes}
+        for r in self._records.values():
+            self._index_add(r)
+
+    def _index_add(self, record: Dict[str, Any]) -> None:
+        for field, idx in self._by_field.items():
+            idx.setdefault(record.get(field), {})[record["id"]] = record
+
+    def _index_remove(self, record: Dict[str, Any]) -> None:
+        for field, idx in self._by_field.items():
+            bucket = idx.get(record.get(field))
+            if bucket is not None:
+                bucket.pop(record["id"], None)
+                if not bucket:
+                    del idx[record.get(field)]
+
+    def _replay(self) -> None:
+        with self.journal_path.open("rb") as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # linha incompleta (escrita interrompida): para aqui
+                    break
+                self._offset += len(line)
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning("Linha inválida ignorada no journal %s", self.journal_path)
+                    continue
+                self._apply(entry)
+
+    def _apply(self, entry: Dict[str, Any]) -> None:
+        if entry.get("op") == "upsert":
+            record = entry["record"]
+            # remove antes para manter a mesma ordem do JsonFileStorage
+            antigo = self._records.pop(record["id"], None)
+            if antigo is not None:
+                self._index_remove(antigo)
+            self._records[record["id"]] = record
+            self._index_add(record)
+        elif entry.get("op") == "delete":
+            antigo = self._records.pop(entry["id"], None)
+            if antigo is not None:
+                self._index_remove(antigo)
+
+    def _sync(self) -> None:
+        # chamar com self._locked(): aplica escritas feitas por outros processos
+        try:
+            size = self.journal_path.stat().st_size
+        except FileNotFoundError:
+            size = 0
+        if file_signature(self.file_path) != self._snapshot_sig or size < self._offset:
+            self._reload()
+        elif size > self._offset:
+            self._replay()
+
+    # ---------------------------------
+    # Escrita
+    # ---------------------------------
+    def _append(self, *entries: Dict[str, Any]) -> None:
+        # várias entradas saem em um único write()
+        # chamar com self._locked() após _sync(): o que houver depois de
+        # self._offset é uma linha incompleta de uma escrita interrompida;
+        # é descartada para a nova entrada não ser colada nela
+        data = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries).encode("utf-8")
+        with self.journal_path.open("r+b") as f:
+            f.seek(self._offset)
+            f.truncate()
+            f.write(data)
+            self._offset = f.tell()
+        for entry in entries:
+            self._apply(entry)
+
+    def _write_snapshot(self) -> None:
+        # chamar com self._locked()
+        tmp = self.file_path.with_suffix(".json.tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(list(self._records.values()), f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.file_path)
+        with self.journal_path.open("w", encoding="utf-8"):
+            pass
+        self._snapshot_sig = file_signature(self.file_path)
+        self._offset = 0
+
+    def _maybe_compact(self) -> None:
+        if self._offset < self.compact_bytes or self._compacting:
+            return
+        self._compacting = True
+        Thread(target=self._compact_background, daemon=True).start()
+
+    def _compact_background(self) -> None:
+        try:
+            self.compact()
+        except Exception as exc:
+            logger.error("Falha ao compactar journal %s: %s", self.journal_path, exc)
+        finally:
+            self._compacting = False
+
+    def compact(self) -> None:
+        """Grava o estado atual como snapshot e esvazia o journal."""
+        with self._locked():
+            self._sync()
+            self._write_snapshot()
+        logger.info("Journal compactado: %s (%d registros)", self.file_path.name, len(self._records))
+
+    # ---------------------------------
+    # Interface do storage
+    # ---------------------------------
+    def version(self) -> Tuple[Optional[Signature], int]:
+        """Muda sempre que o estado muda (escrita deste ou de outro processo)."""
+        with self._locked(shared=True):
+            self._sync()
+            return (self._snapshot_sig, self._offset)
+
+    def last_write_versions(self) -> Tuple[Any, Any]:
+        """(versão antes, versão depois) da última escrita desta thread."""
+        return self._escritas.ultima()
+
+    def list_all(self) -> List[Dict[str, Any]]:
+        with self._locked(shared=True):
+            self._sync()
+            return list(self._records.values())
+
+    def get(self, record_id: str) -> Optional[Dict[str, Any]]:
+        with self._locked(shared=True):
+            self._sync()
+            return self._records.get(record_id)
+
+    def find_by(self, field: str, value: Any) -> List[Dict[str, Any]]:
+        """Registros com `field == value`, via índice hash."""
+        with self._locked(shared=True):
+            self._sync()
+            if field not in self._by_field:
+                # campo não declarado: passa a ser indexado daqui em diante
+                self._by_field[field] = {}
+                for r in self._records.values():
+                    self._by_field[field].setdefault(r.get(field), {})[r["id"]] = r
+            return list(self._by_field[field].get(value, {}).values())
+
+    def save_all(self, records: List[Dict[str, Any]]) -> None:
+        with self._escrita():
+            self._set_records(records)
+            self._write_snapshot()
+
+    def upsert(self, record: Dict[str, Any]) -> None:
+        """Substitui (ou adiciona) o registro com o mesmo `id`."""
+        with self._escrita():
+            self._append({"op": "upsert", "record": record})
+            self._maybe_compact()
+
+    def delete(self, record_id: str) -> bool:
+        with self._escrita():
+            if record_id not in self._records:
+                return False
+            self._append({"op": "delete", "id": record_id})
+            self._maybe_compact()
+            return True
+
+    def upsert_many(self, records: List[Dict[str, Any]]) -> None:
+        if not records:
+            return
+        with self._escrita():
+            self._append(*({"op": "upsert", "record": r} for r in records))
+            self._maybe_compact()
+
+    def delete_many(self, record_ids: List[str]) -> int:
+        with self._escrita():
+            existentes = [i for i in dict.fromkeys(record_ids) if i in self._records]
+            if existentes:
+                self._append(*({"op": "delete", "id": i} for i in existentes))
+                self._maybe_compact()
+            return len(existentes)
+
+
+# Uma instância por arquivo: o estado reconstruído é reaproveitado
+# pelos repositórios criados a cada requisição.
+_journals: Dict[str, JournalFileStorage] = {}
+_journals_lock = Lock()
+
+
+def open_journal(
+    file_path: Path, compact_bytes: int, indexes: Tuple[str, ...] = ()
+) -> JournalFileStorage:
+    key = str(file_path.resolve())
+    with _journals_lock:
+        storage = _journals.get(key)
+        if storage is None:
+            storage = JournalFileStorage(file_path, compact_bytes, indexes)
+            _journals[key] = storage
+        return storage
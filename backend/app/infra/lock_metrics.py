@@ -0,0 +1,113 @@
+import contextlib
+from threading import Lock
+from time import perf_counter
+from typing import Any, Callable, ContextManager, Dict, Iterator, List
+
+from ..core.config import settings
+
+# Limites (ms) dos buckets dos histogramas de espera e de posse
+BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+
+
+class Histogram:
+    def __init__(self) -> None:
+        self.counts: List[int] = [0] * (len(BUCKETS_MS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, seconds: float) -> None:
+        ms = seconds * 1000
+        for i, limite in enumerate(BUCKETS_MS):
+            if ms <= limite:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"<={b}ms" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+        return {
+            "total": self.total,
+            "soma_ms": round(self.sum_ms, 3),
+            "media_ms": round(self.sum_ms / self.total, 3) if self.total else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class LockStats:
+    def __init__(self) -> None:
+        self.espera = Histogram()
+        self.posse = Histogram()
+        self.aguardando = 0
+        self.max_aguardando = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "espera": self.espera.to_dict(),
+            "posse": self.posse.to_dict(),
+            "aguardando": self.aguardando,
+            "max_aguardando": self.max_aguardando,
+        }
+
+
+_stats: Dict[str, LockStats] = {}
+_stats_lock = Lock()
+
+
+@contextlib.contextmanager
+def instrumented(
+    name: str, acquire: Callable[[], Any], release: Callable[[], Any]
+) -> Iterator[None]:
+    """
+    Adquire um lock medindo tempo de espera, tempo de posse e quantas
+    threads aguardam por ele. Só mede com `settings.LOCK_METRICS` ligado;
+    desligado, apenas adquire/libera.
+    """
+    if not settings.LOCK_METRICS:
+        acquire()
+        try:
+            yield
+        finally:
+            release()
+        return
+
+    with _stats_lock:
+        stats = _stats.setdefault(name, LockStats())
+        stats.aguardando += 1
+        stats.max_aguardando = max(stats.max_aguardando, stats.aguardando)
+    inicio = perf_counter()
+    try:
+        acquire()
+    finally:
+        adquirido = perf_counter()
+        with _stats_lock:
+            stats.aguardando -= 1
+            stats.espera.observe(adquirido - inicio)
+    try:
+        yield
+    finally:
+        release()
+        with _stats_lock:
+            stats.posse.observe(perf_counter() - adquirido)
+
+
+def locked(name: str, lock: Any) -> ContextManager[None]:
+    """Atalho para instrumentar Lock/RLock: `with locked("nome", self._lock):`"""
+    return instrumented(name, lock.acquire, lock.release)
+
+
+def snapshot() -> Dict[str, Any]:
+    """Métricas por lock, do maior tempo total de espera para o menor."""
+    with _stats_lock:
+        dados = {name: s.to_dict() for name, s in _stats.items()}
+    return dict(sorted(dados.items(), key=lambda kv: kv[1]["espera"]["soma_ms"], reverse=True))
+
+
+def reset() -> None:
+    with _stats_lock:
+        _stats.clear()
@@ -0,0 +1,133 @@
+import asyncio
+import heapq
+import logging
+from threading import Lock
+from time import monotonic
+from typing import Dict, List, Optional, Tuple
+
+from ..core.config import settings
+from ..services.event_service import enviar_evento_sse
+from .schedule_state import Status, schedule_state
+
+logger = logging.getLogger("reservation_expiry")
+
+
+class ReservationExpiry:
+    """
+    Expira reservas ("reservado") que passam de `settings.RESERVA_TTL_SEGUNDOS`.
+
+    Cada reserva entra num heap de prazos (monotonic); a task assíncrona
+    dorme até o próximo prazo, sem varrer o schedule_state. Se o slot mudou
+    de status antes do prazo (liberado, ocupado, reservado de novo), a
+    entrada antiga no heap é simplesmente ignorada (remoção preguiçosa).
+    Ao expirar, o slot volta a "disponivel" e sai o evento horario_liberado.
+    Reservas que já existiam ao iniciar (backend compartilhado, que não as
+    repassa aos listeners) ganham um prazo cheio a partir do início.
+    """
+
+    def __init__(self) -> None:
+        self._heap: List[Tuple[float, str]] = []
+        self._deadlines: Dict[str, float] = {}  # key → prazo vigente
+        self._lock = Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # chamado pelo schedule_state a cada set_status (de qualquer thread)
+    def on_state_changed(self, key: str, status: Status) -> None:
+        ttl = settings.RESERVA_TTL_SEGUNDOS
+        with self._lock:
+            if status != "reservado" or ttl <= 0:
+                self._deadlines.pop(key, None)
+                return
+            prazo = monotonic() + ttl
+            self._deadlines[key] = prazo
+            heapq.heappush(self._heap, (prazo, key))
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def _semear(self) -> int:
+        """Dá prazo às reservas já existentes que ainda não têm um."""
+        ttl = settings.RESERVA_TTL_SEGUNDOS
+        if ttl <= 0:
+            return 0
+        reservas = [key for key, status in schedule_state.all().items() if status == "reservado"]
+        prazo = monotonic() + ttl
+        novas = 0
+        with self._lock:
+            for key in reservas:
+                if key not in self._deadlines:
+                    self._deadlines[key] = prazo
+                    heapq.heappush(self._heap, (prazo, key))
+                    novas += 1
+        return novas
+
+    def _pop_due(self) -> List[str]:
+        agora = monotonic()
+        vencidas = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= agora:
+                prazo, key = heapq.heappop(self._heap)
+                if self._deadlines.get(key) == prazo:
+                    del self._deadlines[key]
+                    vencidas.append(key)
+        return vencidas
+
+    def _next_delay(self) -> Optional[float]:
+        with self._lock:
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - monotonic())
+
+    def _wait_time(self) -> Optional[float]:
+        espera, intervalo = self._next_delay(), schedule_state.sync_interval
+        if intervalo is None:
+            return espera
+        return intervalo if espera is None else min(espera, intervalo)
+
+    async def _expirar(self, key: str) -> None:
+        if not schedule_state.try_transition(key, "reservado", "disponivel"):
+            return
+        medico_id, _, slot = key.partition(":")
+        logger.info(f"⏰ Reserva expirada: {slot} - Médico: {medico_id}")
+        await enviar_evento_sse("horario_liberado", {"slot": slot, "medico_id": medico_id})
+
+    async def _run(self) -> None:
+        novas = await asyncio.to_thread(self._semear)
+        if novas:
+            logger.info(f"⏳ {novas} reservas existentes entraram na fila de expiração")
+        while True:
+            self._wake.clear()
+            if schedule_state.sync_interval:
+                # reservas feitas por outros workers entram no heap via listener
+                await asyncio.to_thread(schedule_state.sync)
+            for key in self._pop_due():
+                try:
+                    await self._expirar(key)
+                except Exception as exc:
+                    logger.error(f"❌ Erro ao expirar reserva {key}: {exc}", exc_info=True)
+            try:
+                await asyncio.wait_for(self._wake.wait(), self._wait_time())
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = self._loop.create_task(self._run())
+        logger.info(f"Expiração de reservas iniciada (TTL={settings.RESERVA_TTL_SEGUNDOS}s)")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task, self._loop, self._wake = None, None, None
+
+
+reservation_expiry = ReservationExpiry()
+schedule_state.add_listener(reservation_expiry.on_state_changed)
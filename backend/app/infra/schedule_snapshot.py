@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import os
+from datetime import date
+from pathlib import Path
+from typing import Any, Optional
+
+from ..core.config import settings
+from .file_locks import hold_process_lock
+from .schedule_state import schedule_state
+
+logger = logging.getLogger("schedule_snapshot")
+
+
+class ScheduleSnapshotter:
+    """
+    Persiste o schedule_state em memória num snapshot binário
+    (banco/schedule_state.bin): a cada `settings.SCHEDULE_SNAPSHOT_SEGUNDOS`
+    (só se algo mudou) e no shutdown. No startup o snapshot é recarregado;
+    sem snapshot (ou corrompido), o estado é refeito das consultas
+    agendadas numa única passada. Backends duráveis (sqlite) dispensam tudo isso.
+    """
+
+    def __init__(self) -> None:
+        self._task: Optional[asyncio.Task] = None
+        self._versao_salva: Optional[int] = None
+
+    @property
+    def path(self) -> Path:
+        return settings.data_dir / "schedule_state.bin"
+
+    def save(self) -> bool:
+        """Grava o snapshot se o estado mudou desde a última gravação."""
+        if schedule_state.persistent or schedule_state.versao == self._versao_salva:
+            return False
+        versao = schedule_state.versao
+        data = schedule_state.dump()
+        tmp = self.path.with_suffix(".bin.tmp")
+        with tmp.open("wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._versao_salva = versao
+        logger.info(f"Snapshot do schedule_state gravado ({len(data)} bytes)")
+        return True
+
+    def restore(self, consulta_repo: Any) -> None:
+        """Carrega o snapshot; se não houver um válido, refaz a partir das consultas."""
+        if schedule_state.persistent:
+            return
+        # estado em memória é de um único processo: um segundo worker teria
+        # outro estado (reservas duplicadas) e gravaria o mesmo snapshot
+        if not hold_process_lock(settings.data_dir / "schedule_state.lock"):
+            raise RuntimeError(
+                "SCHEDULE_STATE_BACKEND=memory atende um único processo; "
+                "use SCHEDULE_STATE_BACKEND=sqlite com uvicorn --workers N"
+            )
+        try:
+            total = schedule_state.load(self.path.read_bytes())
+            logger.info(f"schedule_state carregado do snapshot: {total} slots")
+        except FileNotFoundError:
+            self._rebuild(consulta_repo)
+        except ValueError as e:
+            logger.warning(f"Snapshot inválido ({e}); refazendo a partir das consultas")
+            self._rebuild(consulta_repo)
+        self._versao_salva = schedule_state.versao
+
+    def _rebuild(self, consulta_repo: Any) -> None:
+        hoje, total = date.today(), 0
+        for c in consulta_repo.list_all():
+            if c.status == "agendada" and c.inicio.date() >= hoje:
+                schedule_state.set_status(f"{c.medico_id}:{c.inicio.isoformat()}", "ocupado")
+                total += 1
+        logger.info(f"schedule_state refeito a partir das consultas: {total} slots ocupados")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.SCHEDULE_SNAPSHOT_SEGUNDOS)
+            try:
+                await asyncio.to_thread(self.save)
+            except Exception as exc:
+                logger.error(f"❌ Erro ao gravar snapshot do schedule_state: {exc}", exc_info=True)
+
+    def start(self) -> None:
+        if schedule_state.persistent or settings.SCHEDULE_SNAPSHOT_SEGUNDOS <= 0:
+            return
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.save)
+
+
+schedule_snapshotter = ScheduleSnapshotter()
@@ -1,24 +1,329 @@
-from typing import Dict, Literal
-from threading import RLock
+import contextlib
+import itertools
+import struct
+import zlib
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Literal, Optional, Tuple, Union
+from threading import Lock, RLock
+
+from ..core.config import settings
+from .lock_metrics import locked
 
 Status = Literal["disponivel", "reservado", "ocupado"]
 
+# código de 2 bits de cada status (0 = disponivel, o valor padrão)
+_STATUS: Tuple[Status, ...] = ("disponivel", "reservado", "ocupado")
+_CODIGO: Dict[str, int] = {s: i for i, s in enumerate(_STATUS)}
+
+MINUTOS_DIA = 24 * 60
+
+# formato do snapshot binário (dump/load): cabeçalho, dias, chaves avulsas, crc32
+_MAGIC = b"SST1"
+_HEADER = struct.Struct("<4sII")  # magic, nº de dias, nº de chaves avulsas
+_DIA_HEADER = struct.Struct("<H")  # tamanho do medico_id / da chave
+_ORDINAL = struct.Struct("<I")  # date.toordinal() / crc32
+
+
+class _Dia:
+    """Status dos 1440 minutos de um dia de um médico, 2 bits cada (360 bytes)."""
+
+    __slots__ = ("bits", "marcados")
+
+    def __init__(self) -> None:
+        self.bits = bytearray(MINUTOS_DIA // 4)
+        self.marcados = 0  # quantos minutos estão ≠ disponivel
+
+    def get(self, minuto: int) -> int:
+        return (self.bits[minuto >> 2] >> ((minuto & 3) * 2)) & 3
+
+    def set(self, minuto: int, codigo: int) -> None:
+        anterior = self.get(minuto)
+        shift = (minuto & 3) * 2
+        self.bits[minuto >> 2] = (self.bits[minuto >> 2] & ~(3 << shift)) | (codigo << shift)
+        self.marcados += (codigo != 0) - (anterior != 0)
+
+    def itens(self):
+        """(minuto, código) dos minutos marcados, pulando bytes zerados."""
+        for i, byte in enumerate(self.bits):
+            if byte:
+                for j in range(4):
+                    codigo = (byte >> (j * 2)) & 3
+                    if codigo:
+                        yield i * 4 + j, codigo
+
+
+def _parse_key(key: str) -> Optional[Tuple[str, date, int]]:
+    """"medico:YYYY-MM-DDTHH:MM:00" → (medico, dia, minuto do dia); None se não for canônica."""
+    medico_id, _, slot_iso = key.partition(":")
+    try:
+        inicio = datetime.fromisoformat(slot_iso)
+    except ValueError:
+        return None
+    if inicio.tzinfo is not None or inicio.second or inicio.microsecond or inicio.isoformat() != slot_iso:
+        return None
+    return medico_id, inicio.date(), inicio.hour * 60 + inicio.minute
+
+
+# nº de locks em que os médicos são distribuídos
+NUM_STRIPES = 16
+
+
+class AvisosOrdenados:
+    """
+    Entrega as mudanças aos listeners na ordem em que foram aplicadas.
+
+    Os listeners rodam fora dos locks do estado (eles pegam os próprios
+    locks, ex.: slot_cache), então duas transições do mesmo slot podem
+    chegar trocadas. Cada mudança leva o `seq` obtido sob o lock do estado;
+    um aviso com seq menor que o último já entregue para a chave é
+    descartado, e o listener termina sempre com o status mais recente.
+
+    A entrega é serializada só por médico (NUM_STRIPES faixas, como no
+    estado). O registro de seqs entregues tem um lock próprio, nunca seguro
+    durante os listeners: `podar` pode ser chamado por quem já segura o lock
+    de um listener (ex.: slot_cache → schedule_state.all()) sem inversão.
+    """
+
+    def __init__(self) -> None:
+        self.listeners: List[Callable[[str, Status], None]] = []
+        self._faixas = [RLock() for _ in range(NUM_STRIPES)]
+        self._lock = Lock()  # só para _entregue
+        self._entregue: Dict[str, int] = {}  # key → maior seq entregue
+
+    def notify(self, key: str, status: Status, seq: int) -> None:
+        i = hash(key.partition(":")[0]) % NUM_STRIPES
+        with locked(f"avisos[{i}]", self._faixas[i]):
+            with self._lock:
+                if seq <= self._entregue.get(key, -1):
+                    return  # já superado por uma mudança posterior
+                self._entregue[key] = seq
+            for fn in self.listeners:
+                fn(key, status)
+
+    def podar(self, hoje: date) -> None:
+        limite = hoje.isoformat()
+        with self._lock:
+            for key in [k for k in self._entregue if k.partition(":")[2][:10] < limite]:
+                del self._entregue[key]
+
+
 class ScheduleState:
+    """
+    Status dos slots ("medico:slot_iso" → disponivel/reservado/ocupado).
+
+    Em vez de um dict de strings que só cresce, guarda por médico e por dia
+    um bitmap de 2 bits por minuto; dias sem nenhum slot marcado não ocupam
+    memória e dias passados são descartados automaticamente (na primeira
+    operação de cada dia). Chaves fora do formato canônico (fuso, segundos)
+    caem num dict à parte, também podado por data.
+
+    Os locks são divididos por médico (NUM_STRIPES faixas): operações em
+    médicos diferentes não disputam o mesmo lock. `try_transition` faz
+    leitura e escrita sob o mesmo lock, então duas reservas simultâneas
+    do mesmo slot nunca passam ambas. Os listeners são chamados fora dos
+    locks, mas na ordem em que as mudanças foram aplicadas (AvisosOrdenados).
+    """
+
+    # estado só deste processo: não há mudanças externas para sincronizar
+    sync_interval: Optional[float] = None
+    # não sobrevive a reinícios: precisa de snapshot (schedule_snapshot)
+    persistent = False
+
     def __init__(self):
-        self._slots: Dict[str, Status] = {}
-        self._lock = RLock()
+        self._dias: Dict[str, Dict[date, _Dia]] = {}
+        self._outros: Dict[str, Status] = {}
+        self._hoje: Optional[date] = None
+        self._versao = 0  # incrementado a cada escrita
+        self._stripes = [RLock() for _ in range(NUM_STRIPES)]
+        # chamados (fora do lock, em ordem) a cada mudança de status: fn(key, status)
+        self._avisos = AvisosOrdenados()
+        self._seq = itertools.count()  # obtido sob a faixa da chave
+
+    def add_listener(self, fn: Callable[[str, Status], None]):
+        self._avisos.listeners.append(fn)
+
+    def _stripe(self, key: str):
+        i = hash(key.partition(":")[0]) % NUM_STRIPES
+        return locked(f"schedule_state[{i}]", self._stripes[i])
+
+    @contextlib.contextmanager
+    def _all_stripes(self) -> Iterator[None]:
+        # sempre na mesma ordem, e nunca com uma faixa já segura
+        with contextlib.ExitStack() as stack:
+            for i, lock in enumerate(self._stripes):
+                stack.enter_context(locked(f"schedule_state[{i}]", lock))
+            yield
+
+    def _podar(self) -> None:
+        """Descarta dias passados; chamado antes de pegar a faixa do médico."""
+        hoje = date.today()
+        if hoje == self._hoje:
+            return
+        with self._all_stripes():
+            if hoje == self._hoje:
+                return
+            for medico_id in list(self._dias):
+                dias = self._dias[medico_id]
+                for dia in [d for d in dias if d < hoje]:
+                    del dias[dia]
+                if not dias:
+                    del self._dias[medico_id]
+            limite = hoje.isoformat()
+            for key in list(self._outros):
+                if key.partition(":")[2][:10] < limite:
+                    del self._outros[key]
+            self._hoje = hoje
+        self._avisos.podar(hoje)
+
+    def sync(self) -> None:
+        """Sem efeito: todas as mudanças já passam pelos listeners."""
 
     def set_status(self, key: str, status: Status):
-        with self._lock:
-            self._slots[key] = status
+        self._podar()
+        with self._stripe(key):
+            self._store(key, status)
+            seq = next(self._seq)
+        self._avisos.notify(key, status, seq)
+
+    def try_transition(
+        self, key: str, expected: Union[Status, Iterable[Status]], new: Status
+    ) -> bool:
+        """
+        Muda o slot para `new` somente se o status atual for `expected`
+        (ou um dos `expected`), de forma atômica. Retorna se mudou.
+        """
+        permitidos = {expected} if isinstance(expected, str) else set(expected)
+        self._podar()
+        with self._stripe(key):
+            if self._load(key) not in permitidos:
+                return False
+            self._store(key, new)
+            seq = next(self._seq)
+        self._avisos.notify(key, new, seq)
+        return True
+
+    def _load(self, key: str) -> Status:
+        parsed = _parse_key(key)
+        if parsed is None:
+            return self._outros.get(key, "disponivel")
+        medico_id, dia, minuto = parsed
+        bitmap = self._dias.get(medico_id, {}).get(dia)
+        return _STATUS[bitmap.get(minuto)] if bitmap else "disponivel"
+
+    def _store(self, key: str, status: Status) -> None:
+        self._versao += 1
+        parsed = _parse_key(key)
+        if parsed is None:
+            if status == "disponivel":
+                self._outros.pop(key, None)
+            else:
+                self._outros[key] = status
+            return
+        medico_id, dia, minuto = parsed
+        if dia < self._hoje:
+            return  # dia passado: nada a guardar
+        dias = self._dias.get(medico_id, {})
+        bitmap = dias.get(dia)
+        if bitmap is None:
+            if status == "disponivel":
+                return
+            bitmap = self._dias.setdefault(medico_id, dias)[dia] = _Dia()
+        bitmap.set(minuto, _CODIGO[status])
+        if not bitmap.marcados:
+            del dias[dia]
+            if not dias:
+                del self._dias[medico_id]
 
     def get_status(self, key: str) -> Status:
-        with self._lock:
-            return self._slots.get(key, "disponivel")
+        self._podar()
+        with self._stripe(key):
+            return self._load(key)
 
     def all(self):
-        with self._lock:
-            return dict(self._slots)
+        self._podar()
+        with self._all_stripes():
+            result: Dict[str, Status] = {}
+            for medico_id, dias in self._dias.items():
+                for dia, bitmap in dias.items():
+                    base = datetime(dia.year, dia.month, dia.day)
+                    for minuto, codigo in bitmap.itens():
+                        slot_iso = (base + timedelta(minutes=minuto)).isoformat()
+                        result[f"{medico_id}:{slot_iso}"] = _STATUS[codigo]
+            result.update(self._outros)
+            return result
+
+    @property
+    def versao(self) -> int:
+        return self._versao
+
+    def dump(self) -> bytes:
+        """Snapshot binário: os bitmaps como estão, mais as chaves avulsas."""
+        self._podar()
+        with self._all_stripes():
+            partes = [_HEADER.pack(_MAGIC, sum(len(d) for d in self._dias.values()), len(self._outros))]
+            for medico_id, dias in self._dias.items():
+                mid = medico_id.encode("utf-8")
+                for dia, bitmap in dias.items():
+                    partes.append(_DIA_HEADER.pack(len(mid)) + mid + _ORDINAL.pack(dia.toordinal()))
+                    partes.append(bytes(bitmap.bits))
+            for key, status in self._outros.items():
+                k = key.encode("utf-8")
+                partes.append(_DIA_HEADER.pack(len(k)) + k + bytes([_CODIGO[status]]))
+        corpo = b"".join(partes)
+        return corpo + _ORDINAL.pack(zlib.crc32(corpo))
+
+    def load(self, data: bytes) -> int:
+        """
+        Substitui o estado pelo de um snapshot de `dump` (dias passados são
+        ignorados) e avisa os listeners de cada slot marcado. Retorna quantos
+        slots foram carregados; ValueError se o snapshot estiver corrompido.
+        """
+        corpo, crc = data[:-_ORDINAL.size], data[-_ORDINAL.size:]
+        if len(data) < _HEADER.size + _ORDINAL.size or _ORDINAL.unpack(crc)[0] != zlib.crc32(corpo):
+            raise ValueError("snapshot corrompido")
+        magic, n_dias, n_outros = _HEADER.unpack_from(corpo)
+        if magic != _MAGIC:
+            raise ValueError("formato de snapshot desconhecido")
+        self._podar()
+        hoje, pos = self._hoje, _HEADER.size
+        dias_lidos: Dict[str, Dict[date, _Dia]] = {}
+        outros: Dict[str, Status] = {}
+        for _ in range(n_dias):
+            (n,) = _DIA_HEADER.unpack_from(corpo, pos)
+            pos += _DIA_HEADER.size
+            medico_id = corpo[pos:pos + n].decode("utf-8")
+            pos += n
+            dia = date.fromordinal(_ORDINAL.unpack_from(corpo, pos)[0])
+            pos += _ORDINAL.size
+            bitmap = _Dia()
+            bitmap.bits[:] = corpo[pos:pos + len(bitmap.bits)]
+            pos += len(bitmap.bits)
+            bitmap.marcados = sum(1 for _ in bitmap.itens())
+            if dia >= hoje and bitmap.marcados:
+                dias_lidos.setdefault(medico_id, {})[dia] = bitmap
+        for _ in range(n_outros):
+            (n,) = _DIA_HEADER.unpack_from(corpo, pos)
+            pos += _DIA_HEADER.size
+            key = corpo[pos:pos + n].decode("utf-8")
+            pos += n
+            outros[key] = _STATUS[corpo[pos]]
+            pos += 1
+        with self._all_stripes():
+            self._dias, self._outros = dias_lidos, outros
+            self._versao += 1
+            carregados = [(key, status, next(self._seq)) for key, status in self.all().items()]
+        for key, status, seq in carregados:
+            self._avisos.notify(key, status, seq)
+        return len(carregados)
+
+
+def _create_schedule_state():
+    # "sqlite": compartilhado entre workers; "memory": só deste processo
+    if settings.SCHEDULE_STATE_BACKEND == "sqlite":
+        from .shared_schedule_state import SqliteScheduleState
+
+        return SqliteScheduleState(settings.schedule_state_path, settings.SQLITE_POOL_SIZE)
+    return ScheduleState()
 
 
-schedule_state = ScheduleState()
+schedule_state = _create_schedule_state()
@@ -0,0 +1,71 @@
+import json
+from pathlib import Path
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable
+
+from ..core.config import settings
+from .file_locks import file_lock
+
+
+def max_numeric_id(records: Iterable[Dict[str, Any]]) -> int:
+    """Maior `id` numérico entre os registros (ids não numéricos são ignorados)."""
+    max_id = 0
+    for r in records:
+        try:
+            max_id = max(max_id, int(r["id"]))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return max_id
+
+
+class SequenceStore:
+    """
+    Sequências monotônicas persistidas em um arquivo JSON ({"consultas": 12, ...}).
+
+    `next` incrementa e grava o contador sob lock exclusivo (arquivo + memória),
+    então inserts simultâneos, inclusive de outros processos, nunca recebem o
+    mesmo id. Na primeira vez que uma sequência é usada (ou se o arquivo se
+    perder) o valor inicial vem de `seed`, tipicamente o maior id já gravado.
+    """
+
+    def __init__(self, file_path: Path) -> None:
+        self.file_path = file_path
+        self._lock = Lock()
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+
+    def _read(self) -> Dict[str, int]:
+        try:
+            data = json.loads(self.file_path.read_text(encoding="utf-8") or "{}")
+            return data if isinstance(data, dict) else {}
+        except (FileNotFoundError, ValueError):
+            # arquivo ausente ou quebrado: as sequências são semeadas de novo
+            return {}
+
+    def next(self, name: str, seed: Callable[[], int]) -> int:
+        with file_lock(self.file_path), self._lock:
+            data = self._read()
+            atual = data.get(name)
+            if not isinstance(atual, int):
+                atual = seed()
+            atual += 1
+            data[name] = atual
+            # escrita no próprio arquivo (sem os.replace) para não trocar o
+            # inode que o file_lock está segurando
+            with self.file_path.open("w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            return atual
+
+
+_stores: Dict[str, SequenceStore] = {}
+_stores_lock = Lock()
+
+
+def next_id(name: str, seed: Callable[[], int]) -> int:
+    """Próximo valor da sequência `name` em banco/sequencias.json."""
+    path = settings.data_dir / "sequencias.json"
+    with _stores_lock:
+        store = _stores.get(str(path))
+        if store is None:
+            store = SequenceStore(path)
+            _stores[str(path)] = store
+    return store.next(name, seed)
@@ -0,0 +1,133 @@
+import logging
+import sqlite3
+from datetime import date
+from pathlib import Path
+from threading import Lock
+from typing import Callable, Dict, Iterable, Optional, Set, Union
+
+from .schedule_state import AvisosOrdenados, Status
+from .sqlite_storage import ConnectionPool, transaction
+
+logger = logging.getLogger("shared_schedule_state")
+
+
+class SqliteScheduleState:
+    """
+    ScheduleState compartilhado entre processos (uvicorn --workers N).
+
+    O status de cada slot fica numa tabela SQLite em WAL; cada mudança
+    roda numa transação BEGIN IMMEDIATE, então `try_transition` é atômico
+    entre threads e entre processos. Toda escrita recebe um número de
+    sequência (`seq`): `sync()` lê as mudanças feitas por outros processos
+    desde a última chamada e as repassa aos listeners locais (slot_cache,
+    expiração de reservas), na ordem dos seqs (AvisosOrdenados). Dias
+    passados são apagados uma vez por dia.
+    """
+
+    # intervalo (s) em que quem depende dos listeners deve chamar sync()
+    sync_interval: Optional[float] = 1.0
+    # já é durável: dispensa snapshot
+    persistent = True
+
+    def __init__(self, db_path: Path, pool_size: int = 4) -> None:
+        self.db_path = db_path
+        self._pool = ConnectionPool(db_path, pool_size)
+        self._avisos = AvisosOrdenados()
+        self._lock = Lock()
+        self._visto = 0  # maior seq já repassado aos listeners
+        self._proprios: Set[int] = set()  # seqs escritos por este processo
+        self._hoje: Optional[date] = None
+        with self._pool.connection() as conn, transaction(conn):
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS slot_status ("
+                "key TEXT PRIMARY KEY, dia TEXT NOT NULL, status TEXT NOT NULL, seq INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_slot_status_seq ON slot_status (seq)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_slot_status_dia ON slot_status (dia)")
+            conn.execute("CREATE TABLE IF NOT EXISTS slot_status_seq (id INTEGER PRIMARY KEY CHECK (id = 1), valor INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO slot_status_seq (id, valor) VALUES (1, 0)")
+            # mudanças anteriores à abertura já estão na tabela (quem carrega
+            # lê com all()); sync() repassa só as novas
+            self._visto = conn.execute("SELECT valor FROM slot_status_seq WHERE id = 1").fetchone()[0]
+        logger.info(f"ScheduleState compartilhado em {db_path}")
+
+    def add_listener(self, fn: Callable[[str, Status], None]):
+        self._avisos.listeners.append(fn)
+
+    def _podar(self, conn: sqlite3.Connection) -> None:
+        hoje = date.today()
+        if hoje == self._hoje:
+            return
+        with transaction(conn):
+            conn.execute("DELETE FROM slot_status WHERE dia < ?", (hoje.isoformat(),))
+        self._hoje = hoje
+        self._avisos.podar(hoje)
+
+    def _write(self, conn: sqlite3.Connection, key: str, status: Status) -> int:
+        conn.execute("UPDATE slot_status_seq SET valor = valor + 1 WHERE id = 1")
+        seq = conn.execute("SELECT valor FROM slot_status_seq WHERE id = 1").fetchone()[0]
+        conn.execute(
+            "INSERT OR REPLACE INTO slot_status (key, dia, status, seq) VALUES (?, ?, ?, ?)",
+            (key, key.partition(":")[2][:10], status, seq),
+        )
+        with self._lock:
+            self._proprios.add(seq)
+        return seq
+
+    @staticmethod
+    def _read(conn: sqlite3.Connection, key: str) -> Status:
+        row = conn.execute("SELECT status FROM slot_status WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else "disponivel"
+
+    def set_status(self, key: str, status: Status):
+        with self._pool.connection() as conn:
+            self._podar(conn)
+            with transaction(conn):
+                seq = self._write(conn, key, status)
+        self._avisos.notify(key, status, seq)
+
+    def try_transition(
+        self, key: str, expected: Union[Status, Iterable[Status]], new: Status
+    ) -> bool:
+        """Muda para `new` somente se o status atual for `expected` (atômico entre processos)."""
+        permitidos = {expected} if isinstance(expected, str) else set(expected)
+        with self._pool.connection() as conn:
+            self._podar(conn)
+            with transaction(conn):
+                if self._read(conn, key) not in permitidos:
+                    return False
+                seq = self._write(conn, key, new)
+        self._avisos.notify(key, new, seq)
+        return True
+
+    def get_status(self, key: str) -> Status:
+        with self._pool.connection() as conn:
+            self._podar(conn)
+            return self._read(conn, key)
+
+    def all(self) -> Dict[str, Status]:
+        with self._pool.connection() as conn:
+            self._podar(conn)
+            rows = conn.execute("SELECT key, status FROM slot_status WHERE status != 'disponivel'").fetchall()
+        return dict(rows)
+
+    def sync(self) -> None:
+        """Repassa aos listeners as mudanças feitas por outros processos."""
+        with self._pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT key, status, seq FROM slot_status WHERE seq > ? ORDER BY seq", (self._visto,)
+            ).fetchall()
+        alheias = []
+        with self._lock:
+            for key, status, seq in rows:
+                if seq <= self._visto:
+                    continue
+                self._visto = seq
+                if seq in self._proprios:
+                    self._proprios.discard(seq)
+                else:
+                    alheias.append((key, status, seq))
+            # seqs próprios já sobrescritos (linha com seq maior) não voltam mais
+            self._proprios = {s for s in self._proprios if s > self._visto}
+        for key, status, seq in alheias:
+            self._avisos.notify(key, status, seq)
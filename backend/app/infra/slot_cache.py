@@ -0,0 +1,508 @@
+import heapq
+import logging
+import uuid
+from collections import deque
+from datetime import date, datetime, timedelta
+from itertools import islice
+from threading import RLock
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from ..core.config import settings
+from .schedule_state import schedule_state
+
+try:
+    import polars as pl
+except ImportError:  # sem polars: só o caminho em Python puro
+    pl = None
+
+logger = logging.getLogger("slot_cache")
+
+# duração de cada slot gerado a partir dos horários
+SLOT_MINUTES = 30
+
+# a partir de quantos dias `slots` monta os dias ainda fora do cache
+# com a geração vetorizada (polars)
+VECTOR_MIN_DAYS = 31
+
+# mapeamento simples de nomes para weekday()
+DIA_MAP = {
+    "segunda": 0,
+    "terca": 1,
+    "quarta": 2,
+    "quinta": 3,
+    "sexta": 4,
+    "sabado": 5,
+    "domingo": 6,
+}
+
+
+def horario_slots(horario: Any) -> List[Tuple[int, int]]:
+    """(hora, minuto) de cada slot de 30 em 30 minutos entre hora_inicio e hora_fim."""
+    # Parse hora_inicio e hora_fim (formato HH:MM)
+    hora_ini, min_ini = (int(p) for p in horario.hora_inicio.split(":")[:2])
+    hora_fim, min_fim = (int(p) for p in horario.hora_fim.split(":")[:2])
+    # valida como o datetime faria (hora 24, minuto 60 etc. são inválidos)
+    datetime(2000, 1, 1, hora_ini, min_ini)
+    datetime(2000, 1, 1, hora_fim, min_fim)
+
+    slots = []
+    atual, fim = hora_ini * 60 + min_ini, hora_fim * 60 + min_fim
+    while atual < fim:
+        slots.append(divmod(atual, 60))
+        atual += SLOT_MINUTES
+    return slots
+
+
+# dia da semana → (hora, minuto) dos slots
+Template = Dict[int, List[Tuple[int, int]]]
+
+
+class SlotCache:
+    """
+    Mapa materializado de slots por médico e por dia, usado por GET /agenda/slots.
+
+    - templates: médico → dia da semana → (hora, minuto) dos slots, vindos
+      dos horários; refeitos só para o médico cujos horários mudaram.
+    - booked: médico → slot ISO → nº de consultas "agendada" naquele início.
+    - state: médico → slot ISO → status do schedule_state (≠ disponivel).
+    - days: (médico, dia) → {slot ISO: status}, montado na primeira consulta
+      do dia e depois corrigido slot a slot quando consultas ou o
+      schedule_state mudam. Dias passados são descartados.
+
+    O carregamento inicial é preguiçoso (primeira chamada a `slots`);
+    antes disso os ganchos de escrita são ignorados. Depois, cada leitura
+    compara a versão dos storages com a da carga: mudanças feitas fora
+    deste processo são aplicadas por diferença.
+
+    Cada mudança de status de um slot (montado ou não), e cada troca de
+    horários de um médico, incrementa `versao` e entra num log limitado
+    (`settings.SLOT_CHANGELOG_TAMANHO`), lido por `changes(since)`.
+    """
+
+    def __init__(self) -> None:
+        self._lock = RLock()
+        self._loaded = False
+        self._dirty: Set[str] = set()
+        self._templates: Dict[str, Dict[int, List[Tuple[int, int]]]] = {}
+        self._ordered: Dict[str, Dict[int, List[Tuple[int, int]]]] = {}
+        self._booked: Dict[str, Dict[str, int]] = {}
+        self._booked_by_id: Dict[str, Tuple[str, str]] = {}
+        self._state: Dict[str, Dict[str, str]] = {}
+        self._days: Dict[Tuple[str, date], Dict[str, str]] = {}
+        self._pruned_on: Optional[date] = None
+        # versões do storage de horários e de consultas refletidas no cache
+        self._versoes: Tuple[Any, Any] = (None, None)
+        # versões são "<época>-<n>": a época é única por processo, então uma
+        # versão de outro worker ou de antes de um reinício leva a resync
+        self._epoca = uuid.uuid4().hex[:12]
+        self._versao = 0
+        self._log: Deque[Dict[str, Any]] = deque(maxlen=settings.SLOT_CHANGELOG_TAMANHO)
+
+    # ---------------------------------
+    # Carga
+    # ---------------------------------
+    def ensure_loaded(self, horario_repo: Any, consulta_repo: Any) -> None:
+        # traz mudanças de status feitas por outros workers (backend compartilhado)
+        schedule_state.sync()
+        # versões lidas antes dos dados: uma escrita no meio só força outra releitura
+        versoes = (horario_repo.storage.version(), consulta_repo.storage.version())
+        with self._lock:
+            if not self._loaded:
+                self._templates, self._ordered = {}, {}
+                for medico_id, horarios in self._por_medico(horario_repo).items():
+                    self._set_templates(medico_id, horarios)
+
+                self._booked, self._booked_by_id = {}, {}
+                for c in consulta_repo.list_all():
+                    self._book(c)
+
+                self._state = {}
+                for key, status in schedule_state.all().items():
+                    self._set_state(key, status)
+
+                self._days.clear()
+                self._pruned_on = None
+                self._dirty.clear()
+                self._versoes = versoes
+                self._loaded = True
+                logger.info(f"Cache de slots carregado: {len(self._templates)} médicos")
+
+            for medico_id in self._dirty:
+                self._set_templates(medico_id, horario_repo.list_by_medico(medico_id))
+            self._dirty.clear()
+
+            # escritas que não passaram pelos ganchos deste processo (outros
+            # workers, edição manual, restore): aplica só a diferença
+            if versoes[0] != self._versoes[0]:
+                self._refresh_horarios(horario_repo)
+            if versoes[1] != self._versoes[1]:
+                self._refresh_consultas(consulta_repo)
+            self._versoes = versoes
+
+    @staticmethod
+    def _por_medico(horario_repo: Any) -> Dict[str, List[Any]]:
+        por_medico: Dict[str, List[Any]] = {}
+        for h in horario_repo.list_all():
+            por_medico.setdefault(h.medico_id, []).append(h)
+        return por_medico
+
+    def _refresh_horarios(self, horario_repo: Any) -> None:
+        por_medico = self._por_medico(horario_repo)
+        for medico_id in set(por_medico) | set(self._templates):
+            horarios = por_medico.get(medico_id, [])
+            if self._build_templates(horarios)[0] != self._templates.get(medico_id, {}):
+                self._set_templates(medico_id, horarios)
+                self._record("medico", medico_id)
+
+    def _refresh_consultas(self, consulta_repo: Any) -> None:
+        anterior = self._booked
+        self._booked, self._booked_by_id = {}, {}
+        for c in consulta_repo.list_all():
+            self._book(c)
+        for medico_id in set(anterior) | set(self._booked):
+            antes, depois = anterior.get(medico_id, {}), self._booked.get(medico_id, {})
+            for slot_iso in set(antes) | set(depois):
+                if bool(antes.get(slot_iso)) != bool(depois.get(slot_iso)):
+                    self._patch(medico_id, slot_iso)
+
+    @staticmethod
+    def _build_templates(horarios: List[Any]) -> Tuple[Template, Template]:
+        """(slots por dia da semana, os mesmos ordenados e sem repetição)."""
+        por_dia: Dict[int, List[Tuple[int, int]]] = {}
+        for h in horarios:
+            target_wd = DIA_MAP.get(h.dia_semana.lower())
+            if target_wd is None:
+                continue
+            try:
+                por_dia.setdefault(target_wd, []).extend(horario_slots(h))
+            except Exception as e:
+                # fallback: ignore horário inválido
+                logger.warning(f"Erro ao processar horário {h.hora_inicio}-{h.hora_fim}: {e}")
+        return por_dia, {wd: sorted(set(hm)) for wd, hm in por_dia.items()}
+
+    def _set_templates(self, medico_id: str, horarios: List[Any]) -> None:
+        for key in [k for k in self._days if k[0] == medico_id]:
+            del self._days[key]
+        if not horarios:
+            self._templates.pop(medico_id, None)
+            self._ordered.pop(medico_id, None)
+            return
+        self._templates[medico_id], self._ordered[medico_id] = self._build_templates(horarios)
+
+    # ---------------------------------
+    # Status de um slot
+    # ---------------------------------
+    def _status(self, medico_id: str, slot_iso: str) -> str:
+        # estado inicial: verificar state, depois consultas
+        estado = self._state.get(medico_id, {}).get(slot_iso, "disponivel")
+        if estado == "disponivel" and self._booked.get(medico_id, {}).get(slot_iso):
+            estado = "ocupado"
+        return estado
+
+    def _patch(self, medico_id: str, slot_iso: str) -> None:
+        try:
+            inicio = datetime.fromisoformat(slot_iso)
+        except ValueError:
+            return
+        dia = inicio.date()
+        if self._pruned_on is not None and dia < self._pruned_on:
+            return  # dia passado
+        status = self._status(medico_id, slot_iso)
+        mapa = self._days.get((medico_id, dia))
+        if mapa is not None:
+            if slot_iso not in mapa or mapa[slot_iso] == status:
+                return
+            mapa[slot_iso] = status
+        elif inicio.isoformat() != slot_iso or not self._no_template(medico_id, inicio):
+            return  # fora dos horários do médico
+        # dia ainda não montado também entra no log: o cliente pode ter
+        # pedido esse dia e o mapa ter sido descartado
+        self._record("slot", medico_id, slot_iso, status)
+
+    def _no_template(self, medico_id: str, inicio: datetime) -> bool:
+        return (inicio.hour, inicio.minute) in self._ordered.get(medico_id, {}).get(inicio.weekday(), ())
+
+    def _day(self, medico_id: str, dia: date) -> Dict[str, str]:
+        mapa = self._days.get((medico_id, dia))
+        if mapa is None:
+            mapa = {}
+            for hora, minuto in self._templates[medico_id].get(dia.weekday(), ()):
+                slot_iso = datetime(dia.year, dia.month, dia.day, hora, minuto).isoformat()
+                mapa[slot_iso] = self._status(medico_id, slot_iso)
+            if self._pruned_on is None or dia >= self._pruned_on:
+                # dias passados são montados sob demanda, sem ficar no cache
+                self._days[(medico_id, dia)] = mapa
+        return mapa
+
+    # ---------------------------------
+    # Consulta
+    # ---------------------------------
+    def _prune(self, hoje: date) -> None:
+        """Descarta dias passados dos mapas e do espelho do schedule_state."""
+        if hoje == self._pruned_on:
+            return
+        self._pruned_on = hoje
+        for key in [k for k in self._days if k[1] < hoje]:
+            del self._days[key]
+        limite = hoje.isoformat()
+        for por_slot in self._state.values():
+            for slot_iso in [s for s in por_slot if s[:10] < limite]:
+                del por_slot[slot_iso]
+
+    def slots(
+        self,
+        start: date,
+        end: date,
+        medico_ids: Optional[Iterable[str]] = None,
+        statuses: Optional[Iterable[str]] = None,
+    ) -> Dict[str, Dict[str, str]]:
+        """
+        { medico_id: { slot_iso: status } } de `start` a `end` (inclusive).
+
+        Só os médicos pedidos (todos, se `medico_ids` for None) e só os dias
+        do intervalo são montados; `statuses` restringe os slots devolvidos.
+        """
+        with self._lock:
+            self._prune(date.today())
+            ids = self._templates if medico_ids is None else [m for m in medico_ids if m in self._templates]
+            filtro = set(statuses) if statuses else None
+            dias = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+            novos: Dict[Tuple[str, date], Dict[str, str]] = {}
+            if pl is not None and len(dias) >= VECTOR_MIN_DAYS:
+                faltando = [(m, dia) for m in ids for dia in dias if (m, dia) not in self._days]
+                if faltando:
+                    novos = self._build_days(faltando)
+                    for (medico_id, dia), mapa in novos.items():
+                        if dia >= self._pruned_on:
+                            self._days[(medico_id, dia)] = mapa
+            result: Dict[str, Dict[str, str]] = {}
+            for medico_id in ids:
+                slots: Dict[str, str] = {}
+                for dia in dias:
+                    mapa = novos.get((medico_id, dia))
+                    if mapa is None:
+                        mapa = self._day(medico_id, dia)
+                    if filtro is None:
+                        slots.update(mapa)
+                    else:
+                        slots.update((k, v) for k, v in mapa.items() if v in filtro)
+                result[medico_id] = slots
+            return result
+
+    def _build_days(self, pares: List[Tuple[str, date]]) -> Dict[Tuple[str, date], Dict[str, str]]:
+        """
+        Mesmo resultado de `_day` para vários (médico, dia) de uma vez, para
+        horizontes longos: os templates são expandidos com um join por dia da
+        semana (polars) e cruzados em lote com as consultas agendadas e o
+        schedule_state, em vez de um datetime/isoformat por slot.
+        """
+        mapas: List[Dict[str, str]] = [{} for _ in pares]
+        medicos = {medico_id for medico_id, _ in pares}
+        templates = [
+            (medico_id, wd, pos, f"T{hora:02d}:{minuto:02d}:00")
+            for medico_id in medicos
+            for wd, horas in self._templates[medico_id].items()
+            for pos, (hora, minuto) in enumerate(horas)
+        ]
+        if not templates:
+            return dict(zip(pares, mapas))
+        df = (
+            pl.DataFrame(
+                [(i, medico_id, dia.weekday(), dia.isoformat()) for i, (medico_id, dia) in enumerate(pares)],
+                schema=[("par", pl.Int64), ("medico_id", pl.String), ("wd", pl.Int64), ("dia", pl.String)],
+                orient="row",
+            )
+            .join(
+                pl.DataFrame(
+                    templates,
+                    schema=[("medico_id", pl.String), ("wd", pl.Int64), ("pos", pl.Int64), ("hora", pl.String)],
+                    orient="row",
+                ),
+                on=["medico_id", "wd"],
+            )
+            .with_columns(slot=pl.concat_str("dia", "hora"))
+        )
+
+        agendados = [
+            (medico_id, slot_iso)
+            for medico_id in medicos
+            for slot_iso, n in self._booked.get(medico_id, {}).items()
+            if n
+        ]
+        estados = [
+            (medico_id, slot_iso, estado)
+            for medico_id in medicos
+            for slot_iso, estado in self._state.get(medico_id, {}).items()
+        ]
+        df = df.join(
+            pl.DataFrame(agendados, schema=[("medico_id", pl.String), ("slot", pl.String)], orient="row")
+            .with_columns(agendado=pl.lit(True)),
+            on=["medico_id", "slot"],
+            how="left",
+        ).join(
+            pl.DataFrame(
+                estados, schema=[("medico_id", pl.String), ("slot", pl.String), ("estado", pl.String)], orient="row"
+            ),
+            on=["medico_id", "slot"],
+            how="left",
+        )
+
+        # mesma regra de `_status`: schedule_state, depois consultas
+        df = df.with_columns(
+            status=pl.when(pl.col("estado").is_not_null())
+            .then(pl.col("estado"))
+            .when(pl.col("agendado"))
+            .then(pl.lit("ocupado"))
+            .otherwise(pl.lit("disponivel"))
+        ).sort(["par", "pos"])
+
+        for par, slot_iso, estado in zip(df["par"].to_list(), df["slot"].to_list(), df["status"].to_list()):
+            mapas[par][slot_iso] = estado
+        return dict(zip(pares, mapas))
+
+    def _free(self, medico_id: str, after: datetime, until: date) -> Iterator[Tuple[datetime, str]]:
+        """Slots disponíveis do médico a partir de `after`, em ordem, até `until`."""
+        ordered = self._ordered[medico_id]
+        dia = after.date()
+        while dia <= until:
+            horas = ordered.get(dia.weekday())
+            if horas:
+                mapa = self._day(medico_id, dia)
+                for hora, minuto in horas:
+                    inicio = datetime(dia.year, dia.month, dia.day, hora, minuto)
+                    if inicio >= after and mapa[inicio.isoformat()] == "disponivel":
+                        yield inicio, medico_id
+            dia += timedelta(days=1)
+
+    def next_available(
+        self, medico_ids: Optional[Iterable[str]], after: datetime, k: int, horizon_days: int
+    ) -> List[Tuple[datetime, str]]:
+        """
+        Os `k` primeiros slots disponíveis (inicio, medico_id) a partir de
+        `after`, entre os médicos pedidos (todos, se None).
+
+        Cada médico é um iterador ordenado sobre os seus templates; os
+        iteradores são intercalados com heapq.merge e só avançam até o
+        k-ésimo resultado, então o custo não depende do horizonte, salvo
+        quando quase tudo está ocupado (limitado por `horizon_days`).
+        """
+        with self._lock:
+            # sem isso, antes do primeiro slots() os dias passados ficariam no cache
+            self._prune(date.today())
+            ids = self._templates if medico_ids is None else [m for m in medico_ids if m in self._templates]
+            until = after.date() + timedelta(days=horizon_days)
+            merged = heapq.merge(*(self._free(m, after, until) for m in ids))
+            return list(islice(merged, k))
+
+    # ---------------------------------
+    # Versão e log de mudanças
+    # ---------------------------------
+    @property
+    def versao(self) -> str:
+        return self._formatar(self._versao)
+
+    def _formatar(self, n: int) -> str:
+        return f"{self._epoca}-{n}"
+
+    def _record(
+        self, tipo: str, medico_id: str, slot_iso: Optional[str] = None, status: Optional[str] = None
+    ) -> None:
+        self._versao += 1
+        self._log.append(
+            {"versao": self._versao, "tipo": tipo, "medico_id": medico_id, "slot": slot_iso, "status": status}
+        )
+
+    def changes(self, since: str) -> Dict[str, Any]:
+        """
+        Mudanças com versão > `since`. `resync` = True quando o log já não
+        cobre `since` (descartado pelo limite, versão de outro worker ou de
+        outra execução): o cliente deve baixar GET /agenda/slots de novo.
+
+        tipo "slot": o slot passou a `status`; tipo "medico": os horários do
+        médico mudaram e os slots dele devem ser recarregados.
+        """
+        epoca, _, n = since.rpartition("-")
+        with self._lock:
+            atual = self.versao
+            if epoca != self._epoca or not n.isdigit():
+                return {"versao": atual, "resync": True, "changes": []}
+            desde = int(n)
+            mais_antiga = self._log[0]["versao"] if self._log else self._versao + 1
+            if desde > self._versao or desde < mais_antiga - 1:
+                return {"versao": atual, "resync": True, "changes": []}
+            mudancas = [
+                {**c, "versao": self._formatar(c["versao"])} for c in self._log if c["versao"] > desde
+            ]
+            return {"versao": atual, "resync": False, "changes": mudancas}
+
+    # ---------------------------------
+    # Ganchos de escrita
+    # ---------------------------------
+    def invalidate_medico(self, medico_id: str) -> None:
+        """Horários do médico mudaram: refaz os templates na próxima leitura."""
+        with self._lock:
+            if self._loaded:
+                self._dirty.add(medico_id)
+                self._record("medico", medico_id)
+
+    def adotar_versao(self, storage: str, antes: Any, depois: Any) -> None:
+        """
+        Escrita deste processo já aplicada pelos ganchos: se o cache estava
+        na versão anterior a ela, passa a refletir a nova (sem releitura em
+        ensure_loaded). `storage` é "horarios" ou "consultas".
+        """
+        idx = 0 if storage == "horarios" else 1
+        with self._lock:
+            if self._loaded and self._versoes[idx] == antes:
+                versoes = list(self._versoes)
+                versoes[idx] = depois
+                self._versoes = (versoes[0], versoes[1])
+
+    def _book(self, consulta: Any) -> None:
+        if consulta.status != "agendada":
+            return
+        slot_iso = consulta.inicio.isoformat()
+        por_slot = self._booked.setdefault(consulta.medico_id, {})
+        por_slot[slot_iso] = por_slot.get(slot_iso, 0) + 1
+        self._booked_by_id[consulta.id] = (consulta.medico_id, slot_iso)
+
+    def _unbook(self, consulta_id: str) -> None:
+        anterior = self._booked_by_id.pop(consulta_id, None)
+        if anterior is None:
+            return
+        medico_id, slot_iso = anterior
+        por_slot = self._booked[medico_id]
+        por_slot[slot_iso] -= 1
+        if not por_slot[slot_iso]:
+            del por_slot[slot_iso]
+        self._patch(medico_id, slot_iso)
+
+    def on_consulta_saved(self, consulta: Any) -> None:
+        with self._lock:
+            if not self._loaded:
+                return
+            self._unbook(consulta.id)
+            self._book(consulta)
+            self._patch(consulta.medico_id, consulta.inicio.isoformat())
+
+    def on_consulta_deleted(self, consulta_id: str) -> None:
+        with self._lock:
+            if self._loaded:
+                self._unbook(consulta_id)
+
+    def _set_state(self, key: str, status: str) -> None:
+        medico_id, _, slot_iso = key.partition(":")
+        if status == "disponivel":
+            self._state.get(medico_id, {}).pop(slot_iso, None)
+        else:
+            self._state.setdefault(medico_id, {})[slot_iso] = status
+        self._patch(medico_id, slot_iso)
+
+    def on_state_changed(self, key: str, status: str) -> None:
+        with self._lock:
+            if self._loaded:
+                self._set_state(key, status)
+
+
+slot_cache = SlotCache()
+schedule_state.add_listener(slot_cache.on_state_changed)
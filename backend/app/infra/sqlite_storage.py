@@ -0,0 +1,242 @@
+import contextlib
+import json
+import logging
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from queue import Empty, Queue
+from threading import Lock
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .file_storage import VersoesDeEscrita
+
+logger = logging.getLogger("sqlite_storage")
+
+# Campos do registro copiados para colunas próprias (com índice)
+INDEXED_FIELDS = ("medico_id", "paciente_id", "inicio")
+
+
+class ConnectionPool:
+    """
+    Pool simples de conexões SQLite reutilizadas entre threads.
+    Cada conexão é usada por uma thread de cada vez.
+    """
+
+    def __init__(self, db_path: Path, size: int = 4) -> None:
+        self.db_path = db_path
+        self.size = size
+        self._idle: "Queue[sqlite3.Connection]" = Queue()
+        self._created = 0
+        self._lock = Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None: transações controladas explicitamente
+        conn = sqlite3.connect(
+            str(self.db_path), timeout=30, check_same_thread=False, isolation_level=None
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextlib.contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        try:
+            conn = self._idle.get_nowait()
+        except Empty:
+            with self._lock:
+                criar = self._created < self.size
+                if criar:
+                    self._created += 1
+            # pool cheio: espera alguma conexão voltar
+            conn = self._connect() if criar else self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+
+@contextlib.contextmanager
+def transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    # IMMEDIATE: pega o lock de escrita já no início (evita deadlock de upgrade)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+class SqliteStorage:
+    """
+    Armazenamento em SQLite (mesma interface do JsonFileStorage).
+
+    Uma tabela por coleção, nomeada pelo arquivo JSON de origem
+    (consultas.json → tabela "consultas"). O registro completo fica em
+    `data` (JSON); `id`, `medico_id`, `paciente_id` e `inicio` ficam em
+    colunas indexadas. Na primeira abertura os registros do arquivo JSON
+    são migrados uma única vez (controle na tabela `_migracoes`).
+    """
+
+    def __init__(self, file_path: Path, pool: ConnectionPool) -> None:
+        self.file_path = file_path
+        self.table = file_path.stem
+        self._pool = pool
+        self._escritas = VersoesDeEscrita()
+
+        with self._pool.connection() as conn:
+            conn.execute(
+                f'CREATE TABLE IF NOT EXISTS "{self.table}" ('
+                "id TEXT PRIMARY KEY, medico_id TEXT, paciente_id TEXT, inicio TEXT, data TEXT NOT NULL)"
+            )
+            for campo in INDEXED_FIELDS:
+                conn.execute(
+                    f'CREATE INDEX IF NOT EXISTS "idx_{self.table}_{campo}" ON "{self.table}" ({campo})'
+                )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS _migracoes (tabela TEXT PRIMARY KEY, origem TEXT, migrado_em TEXT)"
+            )
+            # contador de versão por tabela, incrementado por triggers
+            # (pega também escritas de outros processos e edições manuais)
+            conn.execute("CREATE TABLE IF NOT EXISTS _versoes (tabela TEXT PRIMARY KEY, versao INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO _versoes (tabela, versao) VALUES (?, 0)", (self.table,))
+            for evento in ("INSERT", "UPDATE", "DELETE"):
+                conn.execute(
+                    f'CREATE TRIGGER IF NOT EXISTS "trg_{self.table}_{evento.lower()}" AFTER {evento} ON "{self.table}" '
+                    f"BEGIN UPDATE _versoes SET versao = versao + 1 WHERE tabela = '{self.table}'; END"
+                )
+            self._migrate_json(conn)
+
+    def _migrate_json(self, conn: sqlite3.Connection) -> None:
+        with transaction(conn):
+            if conn.execute("SELECT 1 FROM _migracoes WHERE tabela = ?", (self.table,)).fetchone():
+                return
+            registros: List[Dict[str, Any]] = []
+            if self.file_path.exists():
+                try:
+                    data = json.loads(self.file_path.read_text(encoding="utf-8") or "[]")
+                    if isinstance(data, list):
+                        registros = data
+                except ValueError:
+                    logger.warning("JSON inválido ignorado na migração: %s", self.file_path)
+            self._insert(conn, registros)
+            conn.execute(
+                "INSERT INTO _migracoes (tabela, origem, migrado_em) VALUES (?, ?, ?)",
+                (self.table, str(self.file_path), datetime.utcnow().isoformat()),
+            )
+        logger.info("Migração JSON → SQLite: %s (%d registros)", self.table, len(registros))
+
+    def _insert(self, conn: sqlite3.Connection, records: List[Dict[str, Any]]) -> None:
+        # REPLACE remove a linha antiga: o registro vai para o fim (mesma ordem do JSON)
+        conn.executemany(
+            f'INSERT OR REPLACE INTO "{self.table}" (id, medico_id, paciente_id, inicio, data) '
+            "VALUES (?, ?, ?, ?, ?)",
+            [
+                (
+                    r["id"],
+                    r.get("medico_id"),
+                    r.get("paciente_id"),
+                    r.get("inicio"),
+                    json.dumps(r, ensure_ascii=False),
+                )
+                for r in records
+            ],
+        )
+
+    def _versao(self, conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT versao FROM _versoes WHERE tabela = ?", (self.table,)).fetchone()[0]
+
+    @contextlib.contextmanager
+    def _escrita(self) -> Iterator[sqlite3.Connection]:
+        # transação BEGIN IMMEDIATE + versões antes/depois (last_write_versions)
+        with self._pool.connection() as conn, transaction(conn):
+            antes = self._versao(conn)
+            yield conn
+            self._escritas.registrar(antes, self._versao(conn))
+
+    # ---------------------------------
+    # Interface do storage
+    # ---------------------------------
+    def version(self) -> int:
+        """Muda sempre que a tabela muda (escrita deste ou de outro processo)."""
+        with self._pool.connection() as conn:
+            return self._versao(conn)
+
+    def last_write_versions(self) -> Tuple[Any, Any]:
+        """(versão antes, versão depois) da última escrita desta thread."""
+        return self._escritas.ultima()
+
+    def list_all(self) -> List[Dict[str, Any]]:
+        with self._pool.connection() as conn:
+            rows = conn.execute(f'SELECT data FROM "{self.table}" ORDER BY rowid').fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get(self, record_id: str) -> Optional[Dict[str, Any]]:
+        with self._pool.connection() as conn:
+            row = conn.execute(f'SELECT data FROM "{self.table}" WHERE id = ?', (record_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find_by(self, field: str, value: Any) -> List[Dict[str, Any]]:
+        """Registros com `field == value` (usa o índice da coluna quando existe)."""
+        if field in INDEXED_FIELDS:
+            coluna = field
+        elif field.isidentifier():
+            coluna = f"json_extract(data, '$.{field}')"
+        else:
+            raise ValueError(f"Campo inválido: {field}")
+        with self._pool.connection() as conn:
+            rows = conn.execute(
+                f'SELECT data FROM "{self.table}" WHERE {coluna} = ? ORDER BY rowid', (value,)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def save_all(self, records: List[Dict[str, Any]]) -> None:
+        with self._escrita() as conn:
+            conn.execute(f'DELETE FROM "{self.table}"')
+            self._insert(conn, records)
+
+    def upsert(self, record: Dict[str, Any]) -> None:
+        """Substitui (ou adiciona) o registro com o mesmo `id`."""
+        with self._escrita() as conn:
+            self._insert(conn, [record])
+
+    def delete(self, record_id: str) -> bool:
+        with self._escrita() as conn:
+            cur = conn.execute(f'DELETE FROM "{self.table}" WHERE id = ?', (record_id,))
+            return cur.rowcount > 0
+
+    def upsert_many(self, records: List[Dict[str, Any]]) -> None:
+        if not records:
+            return
+        with self._escrita() as conn:
+            self._insert(conn, records)
+
+    def delete_many(self, record_ids: List[str]) -> int:
+        if not record_ids:
+            return 0
+        with self._escrita() as conn:
+            cur = conn.executemany(
+                f'DELETE FROM "{self.table}" WHERE id = ?', [(i,) for i in dict.fromkeys(record_ids)]
+            )
+            return cur.rowcount
+
+
+# Um pool por banco e uma instância por tabela, reaproveitados
+# pelos repositórios criados a cada requisição.
+_pools: Dict[str, ConnectionPool] = {}
+_storages: Dict[str, SqliteStorage] = {}
+_registry_lock = Lock()
+
+
+def open_sqlite(file_path: Path, db_path: Path, pool_size: int) -> SqliteStorage:
+    with _registry_lock:
+        pool = _pools.get(str(db_path))
+        if pool is None:
+            pool = ConnectionPool(db_path, pool_size)
+            _pools[str(db_path)] = pool
+        key = f"{db_path}:{file_path.stem}"
+        storage = _storages.get(key)
+        if storage is None:
+            storage = SqliteStorage(file_path, pool)
+            _storages[key] = storage
+        return storage
@@ -1,28 +1,366 @@
 import asyncio
-from typing import List
+import json
+import threading
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, Hashable, List, Literal, NamedTuple, Optional, Set, Tuple
 
-# Broker simples para gerenciar assinantes SSE.
-# Controllers adicionam filas;
-# Services enviam eventos para todos assinantes.
+from ..core.config import settings
+
+# Tópicos usados pelos streams de /sistema
+TOPIC_LOGS = "logs"
+TOPIC_AGENDA = "agenda"
+
+
+Politica = Literal["drop_oldest", "coalesce", "disconnect"]
+
+
+class Evento(NamedTuple):
+    seq: Optional[int]  # posição no histórico do tópico
+    data: str
+    event: Optional[str] = None  # tipo SSE nomeado (None = "message")
+    id: Optional[str] = None  # campo `id:` do SSE ("<época>-<seq>")
+
+
+def formatar(evento: Evento) -> str:
+    """Frame SSE: `id:`, `event:` e uma linha `data:` por linha da mensagem."""
+    linhas = []
+    if evento.id is not None:
+        linhas.append(f"id: {evento.id}")
+    if evento.event:
+        linhas.append(f"event: {evento.event}")
+    linhas.extend(f"data: {linha}" for linha in evento.data.split("\n"))
+    return "\n".join(linhas) + "\n\n"
+
+
+def formatar_lote(eventos: List[Evento]) -> str:
+    """
+    Um lote vira um único frame `event: lote` cujo data é a lista JSON das
+    mensagens, com o id do último evento. Lote de um evento só sai como
+    frame comum; eventos nomeados (ex.: resync) saem em frames próprios.
+    """
+    nomeados = [e for e in eventos if e.event]
+    comuns = [e for e in eventos if not e.event]
+    partes = [formatar(e) for e in nomeados]
+    if len(comuns) == 1:
+        partes.append(formatar(comuns[0]))
+    elif comuns:
+        partes.append(formatar(Evento(comuns[-1].seq, json.dumps([e.data for e in comuns]), "lote", comuns[-1].id)))
+    return "".join(partes)
+
+
+class TopicStats:
+    def __init__(self) -> None:
+        self.publicados = 0  # mensagens entregues em filas
+        self.descartados = 0  # mensagens perdidas por fila cheia
+        self.coalescidos = 0  # mensagens substituídas por uma mais nova do mesmo slot
+        self.desconectados = 0  # assinantes derrubados por fila cheia
+        self.lotes = 0  # frames com mais de um evento (modo lote)
+        self.substituidos = 0  # eventos de slot superados dentro de um lote
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "lotes": self.lotes,
+            "substituidos": self.substituidos,
+            "publicados": self.publicados,
+            "descartados": self.descartados,
+            "coalescidos": self.coalescidos,
+            "desconectados": self.desconectados,
+        }
+
+
+class SubscriberQueue:
+    """
+    Fila de um assinante com profundidade máxima. `put_nowait` nunca
+    bloqueia; com a fila cheia aplica a política para consumidor lento:
+
+    - drop_oldest: descarta a mensagem mais antiga;
+    - coalesce: substitui a mensagem pendente do mesmo slot (mesma `chave`);
+      sem uma, descarta a mais antiga;
+    - disconnect: fecha a fila; `get` devolve None e o stream termina.
+    """
+
+    def __init__(self, maxsize: int, politica: Politica, stats: TopicStats) -> None:
+        self.maxsize = maxsize
+        self.politica = politica
+        self.stats = stats
+        self.closed = False
+        self._itens: Deque[Tuple[Optional[Hashable], Evento]] = deque()
+        self._pronto = asyncio.Event()
+
+    def qsize(self) -> int:
+        return len(self._itens)
+
+    def put_nowait(self, evento: Evento, chave: Optional[Hashable] = None) -> None:
+        if self.closed:
+            return
+        if len(self._itens) >= self.maxsize:
+            if self.politica == "disconnect":
+                self.close()
+                self.stats.desconectados += 1
+                return
+            if self.politica == "coalesce" and chave is not None and self._remove_chave(chave):
+                self.stats.coalescidos += 1
+            else:
+                self._itens.popleft()
+                self.stats.descartados += 1
+        self._itens.append((chave, evento))
+        self.stats.publicados += 1
+        self._pronto.set()
+
+    def _remove_chave(self, chave: Hashable) -> bool:
+        for i, (c, _) in enumerate(self._itens):
+            if c == chave:
+                del self._itens[i]
+                return True
+        return False
+
+    def close(self) -> None:
+        self.closed = True
+        self._itens.clear()
+        self._pronto.set()
+
+    async def _esperar(self) -> bool:
+        while not self._itens:
+            if self.closed:
+                return False
+            self._pronto.clear()
+            await self._pronto.wait()
+        return True
+
+    async def get(self) -> Optional[Evento]:
+        if not await self._esperar():
+            return None
+        return self._itens.popleft()[1]
+
+    async def get_lote(self, janela: float) -> Optional[List[Evento]]:
+        """
+        Espera o primeiro evento, junta o que chegar em `janela` segundos e
+        devolve tudo de uma vez. De vários eventos do mesmo slot (mesma
+        `chave`) só fica o último: os anteriores já estão superados.
+        """
+        if not await self._esperar():
+            return None
+        await asyncio.sleep(janela)
+        if not self._itens:
+            return None  # desconectado durante a janela
+        itens = list(self._itens)
+        self._itens.clear()
+        vistos: Set[Hashable] = set()
+        lote: List[Evento] = []
+        for chave, evento in reversed(itens):
+            if chave is not None:
+                if chave in vistos:
+                    self.stats.substituidos += 1
+                    continue
+                vistos.add(chave)
+            lote.append(evento)
+        lote.reverse()
+        if len(lote) > 1:
+            self.stats.lotes += 1
+        return lote
+
+
+def _chave(attrs: Dict[str, Any]) -> Optional[Hashable]:
+    # eventos do mesmo slot podem ser coalescidos
+    if "medico_id" in attrs and "slot" in attrs:
+        return (attrs["medico_id"], attrs["slot"])
+    return None
+
+
+class _Subscriber:
+    __slots__ = ("topic", "queue", "filtros")
+
+    def __init__(self, topic: str, filtros: Dict[str, str], queue: SubscriberQueue) -> None:
+        self.topic = topic
+        self.queue = queue
+        self.filtros = filtros
+
+    def aceita(self, attrs: Dict[str, Any]) -> bool:
+        # atributo ausente no evento = evento geral, entregue a todos
+        return all(k not in attrs or str(attrs[k]) == v for k, v in self.filtros.items())
+
+
+# Broker de eventos SSE por tópico.
+# Controllers assinam um tópico (com filtros opcionais, ex.: medico_id);
+# services publicam num tópico e só as filas interessadas recebem.
 class SSEBroker:
 
-    def __init__(self):
-        self.subscribers: List[asyncio.Queue] = []
+    def __init__(self, maxsize: int = 1000, politica: Politica = "drop_oldest", replay: int = 500):
+        self.maxsize = maxsize
+        self.politica = politica
+        self._stats: Dict[str, TopicStats] = {}
+        # ids "<época>-<seq>": a época é única por execução, então um
+        # Last-Event-ID de outra execução (ou outro worker) leva a resync
+        self._epoca = uuid.uuid4().hex[:12]
+        self._ultimo_id = 0
+        # últimos eventos de cada tópico, para retomar com Last-Event-ID
+        self.replay = replay
+        self._historico: Dict[str, Deque[Tuple[Evento, Dict[str, Any]]]] = {}
+        self._descartado_ate: Dict[str, int] = {}  # maior id que já saiu do histórico
+        # ponte para publicar de outras threads (ver publish_threadsafe)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pendentes: List[Tuple[str, str, Optional[Dict[str, Any]]]] = []
+        self._pendentes_lock = threading.Lock()
+        self._ponte = {"lotes": 0, "eventos": 0, "sem_loop": 0}
+        self._sem_filtro: Dict[str, Set[_Subscriber]] = {}
+        # tópico → campo do filtro → valor → assinantes
+        self._por_filtro: Dict[str, Dict[str, Dict[str, Set[_Subscriber]]]] = {}
+        self._por_fila: Dict[SubscriberQueue, _Subscriber] = {}
+
+    def add_subscriber(
+        self, topic: str, filtros: Optional[Dict[str, str]] = None, last_event_id: Optional[str] = None
+    ) -> SubscriberQueue:
+        """
+        Assina o tópico. Com `last_event_id` (header Last-Event-ID de uma
+        reconexão), a fila já começa com os eventos perdidos desde então;
+        se o histórico não cobre mais esse id, começa com um evento
+        "resync" (o cliente deve recarregar tudo).
+        """
+        stats = self._stats.setdefault(topic, TopicStats())
+        queue = SubscriberQueue(self.maxsize, self.politica, stats)
+        sub = _Subscriber(topic, {k: str(v) for k, v in (filtros or {}).items()}, queue)
+        if last_event_id is not None:
+            self._replay(sub, last_event_id)
+        if sub.filtros:
+            # indexado pelo primeiro filtro; os demais são conferidos no publish
+            campo, valor = next(iter(sub.filtros.items()))
+            self._por_filtro.setdefault(topic, {}).setdefault(campo, {}).setdefault(valor, set()).add(sub)
+        else:
+            self._sem_filtro.setdefault(topic, set()).add(sub)
+        self._por_fila[sub.queue] = sub
+        return sub.queue
+
+    def remove_subscriber(self, queue: SubscriberQueue):
+        sub = self._por_fila.pop(queue, None)
+        if sub is None:
+            return
+        if sub.filtros:
+            campo, valor = next(iter(sub.filtros.items()))
+            por_valor = self._por_filtro[sub.topic][campo]
+            por_valor[valor].discard(sub)
+            if not por_valor[valor]:
+                del por_valor[valor]
+        else:
+            self._sem_filtro[sub.topic].discard(sub)
+
+    def _replay(self, sub: _Subscriber, last_event_id: str) -> None:
+        epoca, _, n = last_event_id.rpartition("-")
+        desde = int(n) if epoca == self._epoca and n.isdigit() else None
+        if desde is None or desde > self._ultimo_id or desde < self._descartado_ate.get(sub.topic, 0):
+            sub.queue.put_nowait(Evento(None, "{}", "resync"))
+            return
+        for evento, attrs in self._historico.get(sub.topic, ()):
+            if evento.seq > desde and sub.aceita(attrs):
+                sub.queue.put_nowait(evento, _chave(attrs))
+
+    def has_subscribers(self, topic: str) -> bool:
+        return bool(self._sem_filtro.get(topic)) or any(self._por_filtro.get(topic, {}).values())
+
+    def _destinos(self, topic: str, attrs: Dict[str, Any]) -> List[_Subscriber]:
+        destinos = list(self._sem_filtro.get(topic, ()))
+        for campo, por_valor in self._por_filtro.get(topic, {}).items():
+            if campo in attrs:
+                candidatos = por_valor.get(str(attrs[campo]), ())
+            else:
+                candidatos = [s for subs in por_valor.values() for s in subs]
+            destinos.extend(s for s in candidatos if s.aceita(attrs))
+        return destinos
+
+    def publish_nowait(self, topic: str, message: str, attrs: Optional[Dict[str, Any]] = None):
+        """
+        Entrega sem bloquear só aos assinantes do tópico cujos filtros batem
+        com `attrs`. Cada evento recebe um id crescente e fica no histórico
+        do tópico. Eventos de slot (medico_id + slot) levam essa chave para
+        a política "coalesce". Deve rodar no loop do servidor.
+        """
+        attrs = attrs or {}
+        self._ultimo_id += 1
+        evento = Evento(self._ultimo_id, message, None, f"{self._epoca}-{self._ultimo_id}")
+        if self.replay > 0:
+            historico = self._historico.setdefault(topic, deque(maxlen=self.replay))
+            if len(historico) == historico.maxlen:
+                self._descartado_ate[topic] = historico[0][0].seq
+            historico.append((evento, attrs))
+        chave = _chave(attrs)
+        for sub in self._destinos(topic, attrs):
+            sub.queue.put_nowait(evento, chave)
+
+    # ---------------------------------
+    # Ponte entre threads
+    # ---------------------------------
+    def attach(self, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        """Define o loop do servidor, dono das filas (None no shutdown)."""
+        self._loop = loop
+
+    def publish_threadsafe(self, topic: str, message: str, attrs: Optional[Dict[str, Any]] = None):
+        """
+        Publica de qualquer thread (worker da fila, asyncio.to_thread, logging).
+
+        Na thread do loop entrega direto. Nas outras, o evento entra numa lista
+        de pendentes e só o primeiro de cada lote agenda um `_flush` com
+        call_soon_threadsafe: uma rajada de eventos custa um único despertar
+        do loop, que entrega todos de uma vez.
+        """
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            self._contar_sem_loop()
+            return
+        try:
+            na_thread_do_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            na_thread_do_loop = False
+        if na_thread_do_loop:
+            self.publish_nowait(topic, message, attrs)
+            return
+        with self._pendentes_lock:
+            self._pendentes.append((topic, message, attrs))
+            agendar = len(self._pendentes) == 1
+        if agendar:
+            try:
+                loop.call_soon_threadsafe(self._flush)
+            except RuntimeError:
+                # loop fechado entre a checagem e o agendamento
+                self._contar_sem_loop()
+
+    def _contar_sem_loop(self) -> None:
+        # chamado de qualquer thread: contadores da ponte só mudam sob o lock
+        with self._pendentes_lock:
+            self._ponte["sem_loop"] += 1
 
-    def add_subscriber(self) -> asyncio.Queue:
-        queue = asyncio.Queue()
-        self.subscribers.append(queue)
-        return queue
+    def _flush(self) -> None:
+        with self._pendentes_lock:
+            lote, self._pendentes = self._pendentes, []
+            self._ponte["lotes"] += 1
+            self._ponte["eventos"] += len(lote)
+        for topic, message, attrs in lote:
+            self.publish_nowait(topic, message, attrs)
 
-    def remove_subscriber(self, queue: asyncio.Queue):
-        if queue in self.subscribers:
-            self.subscribers.remove(queue)
+    async def publish(self, topic: str, message: str, attrs: Optional[Dict[str, Any]] = None):
+        # seguro também em loops de outras threads (ex.: asyncio.run do worker)
+        self.publish_threadsafe(topic, message, attrs)
 
-    async def publish(self, message: str):
-        # envia para todos assinantes conectados
-        for queue in list(self.subscribers):
-            await queue.put(message)
+    def stats(self) -> Dict[str, Any]:
+        """Contadores por tópico e profundidade atual das filas."""
+        dados: Dict[str, Any] = {}
+        for topic, stats in self._stats.items():
+            filas = [s.queue.qsize() for s in self._por_fila.values() if s.topic == topic]
+            dados[topic] = {
+                **stats.to_dict(),
+                "assinantes": len(filas),
+                "profundidade_total": sum(filas),
+                "profundidade_max": max(filas, default=0),
+            }
+        with self._pendentes_lock:
+            ponte = dict(self._ponte)
+        return {
+            "maxsize": self.maxsize,
+            "politica": self.politica,
+            "ultimo_id": f"{self._epoca}-{self._ultimo_id}",
+            "topicos": dados,
+            "ponte": ponte,
+        }
 
 
 # Singleton global
-sse_broker = SSEBroker()
+sse_broker = SSEBroker(settings.SSE_FILA_MAX, settings.SSE_POLITICA_LENTO, settings.SSE_REPLAY_TAMANHO)
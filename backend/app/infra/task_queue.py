@@ -48,6 +48,9 @@ class TaskQueue:
 
     def _worker_loop(self) -> None:
         logger.info("Worker iniciado")
+        # um loop próprio para toda a vida do worker (em vez de um asyncio.run
+        # por tarefa); eventos SSE vão para o loop do servidor pela ponte do broker
+        loop = asyncio.new_event_loop()
         while not self._stop_event.is_set():
             try:
                 task = self._queue.get(timeout=1)
@@ -59,13 +62,14 @@ class TaskQueue:
                 break
 
             try:
-                asyncio.run(self._process_task(task))
+                loop.run_until_complete(self._process_task(task))
             except Exception as exc:
                 logger.exception("Erro ao processar tarefa %s: %s", task.id, exc)
 
             finally:
                 self._queue.task_done()
 
+        loop.close()
         logger.info("Worker finalizado")
 
     async def _process_task(self, task: Task) -> None:
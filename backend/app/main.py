@@ -1,12 +1,18 @@
 
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 
 from app.controllers import consulta_controller, medico_controller, paciente_controller, sistema_controller, backup_controller, report_controller, horario_controller, agenda_controller
 from app.infra import task_queue
+from app.infra.reservation_expiry import reservation_expiry
+from app.infra.schedule_snapshot import schedule_snapshotter
+from app.infra.sse import sse_broker
 
 from .core.log import configure_logging
+from .repositories.registry import get_consulta_repository, init_repositories
 from .seeds.data import seed_initial_data, seed_initial_medicos, seed_initial_horarios
 
 # configura logging logo no início
@@ -28,6 +34,7 @@ app.add_middleware(
      allow_credentials=True,
      allow_methods=["*"],
      allow_headers=["*"],
+     expose_headers=["X-Agenda-Versao"],  # lido pelo front para GET /agenda/slots/changes
 )
 
 #rotas
@@ -44,18 +51,31 @@ from .seeds.data import seed_initial_consultas
 
 @app.on_event("startup")
 async def on_startup():
+    # eventos SSE publicados de outras threads chegam por este loop
+    sse_broker.attach(asyncio.get_running_loop())
     task_queue.task_queue.start()
+    reservation_expiry.start()
+
+    # repositórios/storages compartilhados por todo o processo
+    init_repositories()
     
     # cria dados iniciais
     await seed_initial_data()
     await seed_initial_medicos()
     await seed_initial_horarios()
     await seed_initial_consultas()
+
+    # status dos slots: snapshot anterior ou, sem ele, refeito das consultas
+    await asyncio.to_thread(schedule_snapshotter.restore, get_consulta_repository())
+    schedule_snapshotter.start()
     
 @app.on_event("shutdown")
 async def on_shutdown():
     # para worker da fila
-    task_queue.task_queue.stop()        
+    task_queue.task_queue.stop()
+    await reservation_expiry.stop()
+    await schedule_snapshotter.stop()
+    sse_broker.attach(None)
 
 @app.get("/", tags=["Health"])
 async def health_check():
@@ -1,17 +1,32 @@
 from dataclasses import asdict
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional
+from threading import Lock
+from typing import Any, Dict, List, Optional, Set
 
 from ..core.config import settings
-from ..infra.file_storage import JsonFileStorage
+from ..infra.file_storage import open_storage
+from ..infra import sequences
+from ..infra.interval_index import Interval, IntervalIndex
+from ..infra.slot_cache import slot_cache
 from ..models.consulta_model import Consulta
 
+# Índice de intervalos por médico, compartilhado entre as instâncias
+# (uma por arquivo), junto com a versão do storage que ele reflete.
+# Escritas deste processo entram no índice com add/remove e avançam a
+# versão; se o storage mudou por fora (outro processo, edição manual,
+# restore), o índice é descartado e cada médico é relido sob demanda.
+_intervalos: Dict[str, IntervalIndex] = {}
+_versoes: Dict[str, Any] = {}  # arquivo → versão do storage refletida no índice
+_carregados: Dict[str, Set[str]] = {}  # arquivo → médicos já lidos do storage
+_intervalos_lock = Lock()
+
 
 class ConsultaRepository:
     def __init__(self):
         file_path = settings.data_dir / "consultas.json"
-        self.storage = JsonFileStorage(file_path)
+        self.file_path = file_path
+        self.storage = open_storage(file_path, indexes=("medico_id", "paciente_id"))
 
         if not file_path.exists() or file_path.stat().st_size == 0:
             file_path.write_text("[]", encoding="utf-8")
@@ -40,23 +55,100 @@ class ConsultaRepository:
     def list_all(self) -> List[Consulta]:
         return [self._deserialize(r) for r in self.storage.list_all()]
 
+    def list_by_medico(self, medico_id: str) -> List[Consulta]:
+        return [self._deserialize(r) for r in self.storage.find_by("medico_id", medico_id)]
+
+    def list_by_paciente(self, paciente_id: str) -> List[Consulta]:
+        return [self._deserialize(r) for r in self.storage.find_by("paciente_id", paciente_id)]
+
+    def next_id(self) -> str:
+        """Próximo id numérico (sequência persistida, semeada pelo maior id existente)."""
+        return str(sequences.next_id("consultas", lambda: sequences.max_numeric_id(self.storage.list_all())))
+
     def get_by_id(self, consulta_id: str) -> Optional[Consulta]:
-        for r in self.storage.list_all():
-            if r["id"] == consulta_id:
-                return self._deserialize(r)
-        return None
+        raw = self.storage.get(consulta_id)
+        return self._deserialize(raw) if raw else None
 
     def save(self, consulta: Consulta) -> Consulta:
-        registros = self.storage.list_all()
-        registros = [r for r in registros if r["id"] != consulta.id]
-        registros.append(self._serialize(consulta))
-        self.storage.save_all(registros)
+        self.storage.upsert(self._serialize(consulta))
+        self._aplicar_escrita(salvas=[consulta])
+        slot_cache.on_consulta_saved(consulta)
+        slot_cache.adotar_versao("consultas", *self.storage.last_write_versions())
         return consulta
 
     def delete(self, consulta_id: str) -> bool:
-        registros = self.storage.list_all()
-        novos = [r for r in registros if r["id"] != consulta_id]
-        if len(novos) == len(registros):
-            return False
-        self.storage.save_all(novos)
-        return True
+        ok = self.storage.delete(consulta_id)
+        self._aplicar_escrita(removidas=[consulta_id])
+        slot_cache.on_consulta_deleted(consulta_id)
+        slot_cache.adotar_versao("consultas", *self.storage.last_write_versions())
+        return ok
+
+    def save_many(self, consultas: List[Consulta]) -> None:
+        if not consultas:
+            return
+        self.storage.upsert_many([self._serialize(x) for x in consultas])
+        self._aplicar_escrita(salvas=consultas)
+        for c in consultas:
+            slot_cache.on_consulta_saved(c)
+        slot_cache.adotar_versao("consultas", *self.storage.last_write_versions())
+
+    def delete_many(self, ids: List[str]) -> int:
+        if not ids:
+            return 0
+        removidos = self.storage.delete_many(ids)
+        self._aplicar_escrita(removidas=ids)
+        for consulta_id in ids:
+            slot_cache.on_consulta_deleted(consulta_id)
+        slot_cache.adotar_versao("consultas", *self.storage.last_write_versions())
+        return removidos
+
+    # ÍNDICE DE INTERVALOS (conflito de agenda)
+    def _aplicar_escrita(self, salvas: List[Consulta] = (), removidas: List[str] = ()) -> None:
+        # a escrita que acabou de acontecer nesta thread entra direto no índice,
+        # desde que ele estivesse exatamente na versão anterior a ela
+        antes, depois = self.storage.last_write_versions()
+        key = str(self.file_path)
+        with _intervalos_lock:
+            index = _intervalos.get(key)
+            if index is None or _versoes.get(key) != antes:
+                return  # índice defasado: o próximo intervalos() relê
+            carregados = _carregados[key]
+            for c in salvas:
+                if c.medico_id in carregados:
+                    index.add(c.medico_id, c.id, c.inicio, c.fim)
+                else:
+                    # médico ainda não lido (ou consulta trocada de médico)
+                    index.remove(c.id)
+            for consulta_id in removidas:
+                index.remove(consulta_id)
+            _versoes[key] = depois
+
+    def intervalos(self, medico_id: str) -> IntervalIndex:
+        """Índice com os intervalos de `medico_id` em dia com o storage."""
+        key = str(self.file_path)
+        # versão lida antes dos dados: uma escrita no meio só força outra releitura
+        versao = self.storage.version()
+        with _intervalos_lock:
+            index = _intervalos.setdefault(key, IntervalIndex())
+            carregados = _carregados.setdefault(key, set())
+            if _versoes.get(key) != versao:
+                # mudança que não passou por _aplicar_escrita: descarta tudo
+                index.load(())
+                carregados.clear()
+                _versoes[key] = versao
+            if medico_id not in carregados:
+                index.load_key(
+                    medico_id,
+                    (
+                        (r["id"], datetime.fromisoformat(r["inicio"]), datetime.fromisoformat(r["fim"]))
+                        for r in self.storage.find_by("medico_id", medico_id)
+                    ),
+                )
+                carregados.add(medico_id)
+            return index
+
+    def find_conflict(
+        self, medico_id: str, inicio: datetime, fim: datetime, ignore_id: Optional[str] = None
+    ) -> Optional[Interval]:
+        """(inicio, fim, id) da consulta do médico que sobrepõe o período, se houver."""
+        return self.intervalos(medico_id).find_overlap(medico_id, inicio, fim, ignore_id)
@@ -1,7 +1,8 @@
 
 from pathlib import Path
 from ..core.config import settings
-from ..infra.file_storage import JsonFileStorage
+from ..infra.file_storage import open_storage
+from ..infra.slot_cache import slot_cache
 from ..models.horario_model import Horario
 from typing import Optional, List
 from dataclasses import asdict
@@ -10,7 +11,7 @@ import uuid
 class HorarioRepository:
     def __init__(self):
         file_path = settings.data_dir / "horarios.json"
-        self.storage = JsonFileStorage(file_path)
+        self.storage = open_storage(file_path, indexes=("medico_id",))
         if not file_path.exists():
             file_path.write_text("[]", encoding="utf-8")
 
@@ -84,25 +85,43 @@ class HorarioRepository:
         return [self._deserialize(r) for r in self.storage.list_all()]
 
     def list_by_medico(self, medico_id: str) -> List[Horario]:
-        return [h for h in self.list_all() if h.medico_id == medico_id]
+        return [self._deserialize(r) for r in self.storage.find_by("medico_id", medico_id)]
 
     def get_by_id(self, horario_id: str) -> Optional[Horario]:
-        for r in self.storage.list_all():
-            if r["id"] == horario_id:
-                return self._deserialize(r)
-        return None
+        raw = self.storage.get(horario_id)
+        return self._deserialize(raw) if raw else None
 
     def save(self, horario: Horario) -> Horario:
-        registros = self.storage.list_all()
-        registros = [r for r in registros if r["id"] != horario.id]
-        registros.append(self._serialize(horario))
-        self.storage.save_all(registros)
+        anterior = self.storage.get(horario.id)
+        self.storage.upsert(self._serialize(horario))
+        if anterior and anterior["medico_id"] != horario.medico_id:
+            slot_cache.invalidate_medico(anterior["medico_id"])
+        slot_cache.invalidate_medico(horario.medico_id)
+        slot_cache.adotar_versao("horarios", *self.storage.last_write_versions())
         return horario
 
     def delete(self, horario_id: str) -> bool:
-        registros = self.storage.list_all()
-        new_registros = [r for r in registros if r["id"] != horario_id]
-        if len(new_registros) == len(registros):
-            return False
-        self.storage.save_all(new_registros)
-        return True
+        anterior = self.storage.get(horario_id)
+        ok = self.storage.delete(horario_id)
+        if ok and anterior:
+            slot_cache.invalidate_medico(anterior["medico_id"])
+        slot_cache.adotar_versao("horarios", *self.storage.last_write_versions())
+        return ok
+
+    def save_many(self, horarios: List[Horario]) -> None:
+        if not horarios:
+            return
+        self.storage.upsert_many([self._serialize(x) for x in horarios])
+        for medico_id in {h.medico_id for h in horarios}:
+            slot_cache.invalidate_medico(medico_id)
+        slot_cache.adotar_versao("horarios", *self.storage.last_write_versions())
+
+    def delete_many(self, ids: List[str]) -> int:
+        if not ids:
+            return 0
+        anteriores = [r for r in (self.storage.get(i) for i in ids) if r]
+        removidos = self.storage.delete_many(ids)
+        for medico_id in {r["medico_id"] for r in anteriores}:
+            slot_cache.invalidate_medico(medico_id)
+        slot_cache.adotar_versao("horarios", *self.storage.last_write_versions())
+        return removidos
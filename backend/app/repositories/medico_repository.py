@@ -6,14 +6,15 @@ from pathlib import Path
 from typing import List, Optional
 
 from ..core.config import settings
-from ..infra.file_storage import JsonFileStorage
+from ..infra.file_storage import open_storage
+from ..infra import sequences
 from ..models.medico_model import Medico
 
 
 class MedicoRepository:
     def __init__(self):
         file_path = settings.data_dir / "medicos.json"
-        self.storage = JsonFileStorage(file_path)
+        self.storage = open_storage(file_path, indexes=("especialidade",))
 
         # garante JSON válido
         if not file_path.exists() or file_path.stat().st_size == 0:
@@ -40,23 +41,26 @@ class MedicoRepository:
     def list_all(self) -> List[Medico]:
         return [self._deserialize(r) for r in self.storage.list_all()]
 
+    def list_by_especialidade(self, especialidade: str) -> List[Medico]:
+        return [self._deserialize(r) for r in self.storage.find_by("especialidade", especialidade)]
+
+    def next_id(self) -> str:
+        """Próximo id numérico (sequência persistida, semeada pelo maior id existente)."""
+        return str(sequences.next_id("medicos", lambda: sequences.max_numeric_id(self.storage.list_all())))
+
     def get_by_id(self, medico_id: str) -> Optional[Medico]:
-        for r in self.storage.list_all():
-            if r["id"] == medico_id:
-                return self._deserialize(r)
-        return None
+        raw = self.storage.get(medico_id)
+        return self._deserialize(raw) if raw else None
 
     def save(self, medico: Medico) -> Medico:
-        registros = self.storage.list_all()
-        registros = [r for r in registros if r["id"] != medico.id]
-        registros.append(self._serialize(medico))
-        self.storage.save_all(registros)
+        self.storage.upsert(self._serialize(medico))
         return medico
 
     def delete(self, medico_id: str) -> bool:
-        registros = self.storage.list_all()
-        new_registros = [r for r in registros if r["id"] != medico_id]
-        if len(registros) == len(new_registros):
-            return False
-        self.storage.save_all(new_registros)
-        return True
+        return self.storage.delete(medico_id)
+
+    def save_many(self, medicos: List[Medico]) -> None:
+        self.storage.upsert_many([self._serialize(x) for x in medicos])
+
+    def delete_many(self, ids: List[str]) -> int:
+        return self.storage.delete_many(ids)
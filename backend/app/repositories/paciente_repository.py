@@ -1,6 +1,7 @@
 from pathlib import Path
 from ..core.config import settings
-from ..infra.file_storage import JsonFileStorage
+from ..infra.file_storage import open_storage
+from ..infra import sequences
 from ..models.paciente_model import Paciente
 from datetime import datetime, date
 from typing import Optional, List
@@ -10,7 +11,7 @@ from dataclasses import asdict
 class PacienteRepository:
     def __init__(self):
         file_path = settings.data_dir / "pacientes.json"
-        self.storage = JsonFileStorage(file_path)
+        self.storage = open_storage(file_path)
 
         # garante que o arquivo exista
         if not file_path.exists():
@@ -38,23 +39,23 @@ class PacienteRepository:
     def list_all(self) -> List[Paciente]:
         return [self._deserialize(r) for r in self.storage.list_all()]
 
+    def next_id(self) -> str:
+        """Próximo id numérico (sequência persistida, semeada pelo maior id existente)."""
+        return str(sequences.next_id("pacientes", lambda: sequences.max_numeric_id(self.storage.list_all())))
+
     def get_by_id(self, paciente_id: str) -> Optional[Paciente]:
-        for r in self.storage.list_all():
-            if r["id"] == paciente_id:
-                return self._deserialize(r)
-        return None
+        raw = self.storage.get(paciente_id)
+        return self._deserialize(raw) if raw else None
 
     def save(self, paciente: Paciente) -> Paciente:
-        registros = self.storage.list_all()
-        registros = [r for r in registros if r["id"] != paciente.id]
-        registros.append(self._serialize(paciente))
-        self.storage.save_all(registros)
+        self.storage.upsert(self._serialize(paciente))
         return paciente
 
     def delete(self, paciente_id: str) -> bool:
-        registros = self.storage.list_all()
-        new_registros = [r for r in registros if r["id"] != paciente_id]
-        if len(new_registros) == len(registros):
-            return False
-        self.storage.save_all(new_registros)
-        return True
+        return self.storage.delete(paciente_id)
+
+    def save_many(self, pacientes: List[Paciente]) -> None:
+        self.storage.upsert_many([self._serialize(x) for x in pacientes])
+
+    def delete_many(self, ids: List[str]) -> int:
+        return self.storage.delete_many(ids)
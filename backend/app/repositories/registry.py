@@ -0,0 +1,50 @@
+from threading import Lock
+from typing import Any, Callable, Dict, TypeVar
+
+from .consulta_repository import ConsultaRepository
+from .horario_repository import HorarioRepository
+from .medico_repository import MedicoRepository
+from .paciente_repository import PacienteRepository
+
+T = TypeVar("T")
+
+# Uma instância de cada repositório (e do storage dele) por processo.
+# Criadas no startup e injetadas nos controllers via Depends, para que
+# caches e índices dos storages sobrevivam entre requisições.
+_instances: Dict[type, Any] = {}
+_lock = Lock()
+
+
+def _shared(cls: Callable[[], T]) -> T:
+    instance = _instances.get(cls)
+    if instance is None:
+        with _lock:
+            instance = _instances.get(cls)
+            if instance is None:
+                instance = cls()
+                _instances[cls] = instance
+    return instance
+
+
+def get_consulta_repository() -> ConsultaRepository:
+    return _shared(ConsultaRepository)
+
+
+def get_horario_repository() -> HorarioRepository:
+    return _shared(HorarioRepository)
+
+
+def get_medico_repository() -> MedicoRepository:
+    return _shared(MedicoRepository)
+
+
+def get_paciente_repository() -> PacienteRepository:
+    return _shared(PacienteRepository)
+
+
+def init_repositories() -> None:
+    """Cria todos os repositórios (chamado no startup da aplicação)."""
+    get_paciente_repository()
+    get_medico_repository()
+    get_horario_repository()
+    get_consulta_repository()
@@ -3,26 +3,28 @@ import logging
 from datetime import datetime, date
 from uuid import uuid4
 
-from ..repositories.horario_repository import HorarioRepository
+from ..repositories.registry import (
+    get_consulta_repository,
+    get_horario_repository,
+    get_medico_repository,
+    get_paciente_repository,
+)
 from ..models.horario_model import Horario
-from ..repositories.consulta_repository import ConsultaRepository
 from ..models.consulta_model import Consulta
-from ..repositories.paciente_repository import PacienteRepository
 from ..models.paciente_model import Paciente
-from ..repositories.medico_repository import MedicoRepository
 from ..models.medico_model import Medico
 
 logger = logging.getLogger(__name__)
 
 async def seed_initial_horarios():
-    repo = HorarioRepository()
+    repo = get_horario_repository()
     existentes = await asyncio.to_thread(repo.list_all)
     if existentes:
         logger.info("Seed: horários já existentes, ignorando.")
         return
 
     # Cria horários para cada médico existente (seg/ter/qua/qui/sex - 8h às 18h)
-    medicos = await asyncio.to_thread(MedicoRepository().list_all)
+    medicos = await asyncio.to_thread(get_medico_repository().list_all)
     horarios = []
     dias = ["segunda", "terca", "quarta", "quinta", "sexta"]
     
@@ -39,21 +41,21 @@ async def seed_initial_horarios():
                 )
                 horarios.append(horario)
     
-    for h in horarios:
-        await asyncio.to_thread(repo.save, h)
+    # grava todos de uma vez (um lock, uma escrita)
+    await asyncio.to_thread(repo.save_many, horarios)
     
     logger.info(f"Horários iniciais criados: {len(horarios)} horários para {len(medicos)} médicos.")
 
 # Seed para consultas
 async def seed_initial_consultas():
-    repo = ConsultaRepository()
+    repo = get_consulta_repository()
     existentes = await asyncio.to_thread(repo.list_all)
     if existentes:
         logger.info("Seed: consultas já existentes, ignorando.")
         return
 
-    pacientes = await asyncio.to_thread(PacienteRepository().list_all)
-    medicos = await asyncio.to_thread(MedicoRepository().list_all)
+    pacientes = await asyncio.to_thread(get_paciente_repository().list_all)
+    medicos = await asyncio.to_thread(get_medico_repository().list_all)
     now = datetime.utcnow()
     consultas = []
     if pacientes and medicos:
@@ -71,12 +73,12 @@ async def seed_initial_consultas():
             )
         )
     if consultas:
-        repo.storage.save_all([repo._serialize(c) for c in consultas])
+        await asyncio.to_thread(repo.save_many, consultas)
         logger.info("Consultas iniciais criadas.")
 
 
 async def seed_initial_data():
-    repo = PacienteRepository()
+    repo = get_paciente_repository()
 
     # Se já houver pacientes, não faz seed
     existentes = await asyncio.to_thread(repo.list_all)
@@ -105,7 +107,7 @@ async def seed_initial_data():
     logger.info("Pacientes iniciais criados.")
 
 async def seed_initial_medicos():
-    repo = MedicoRepository()
+    repo = get_medico_repository()
     existentes = await asyncio.to_thread(repo.list_all)
 
     if existentes:
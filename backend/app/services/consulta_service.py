@@ -8,6 +8,7 @@ from ..models.consulta_model import Consulta
 from ..repositories.consulta_repository import ConsultaRepository
 from ..repositories.paciente_repository import PacienteRepository
 from ..repositories.medico_repository import MedicoRepository
+from ..repositories.registry import get_consulta_repository, get_medico_repository, get_paciente_repository
 from ..schemas.consulta_schema import ConsultaCreate, ConsultaUpdate
 
 logger = logging.getLogger("consulta_service")
@@ -20,9 +21,10 @@ class ConsultaService:
         paciente_repo: Optional[PacienteRepository] = None,
         medico_repo: Optional[MedicoRepository] = None,
     ):
-        self.repo = repo or ConsultaRepository()
-        self.paciente_repo = paciente_repo or PacienteRepository()
-        self.medico_repo = medico_repo or MedicoRepository()
+        # repositórios compartilhados por padrão (caches/índices vivem neles)
+        self.repo = repo or get_consulta_repository()
+        self.paciente_repo = paciente_repo or get_paciente_repository()
+        self.medico_repo = medico_repo or get_medico_repository()
 
     # LISTAR / OBTER
     async def listar_consultas(self) -> List[Consulta]:
@@ -57,17 +59,8 @@ class ConsultaService:
         # validar conflito
         await self._validar_conflito(payload.medico_id, payload.inicio, payload.fim)
 
-        # Gera ID auto-incremental
-        consultas_existentes = await asyncio.to_thread(self.repo.list_all)
-        max_id = 0
-        for c in consultas_existentes:
-            try:
-                cid = int(c.id)
-                if cid > max_id:
-                    max_id = cid
-            except ValueError:
-                continue
-        novo_id = str(max_id + 1)
+        # Gera ID auto-incremental (sequência persistida, atômica)
+        novo_id = await asyncio.to_thread(self.repo.next_id)
 
         now = datetime.utcnow()
         consulta = Consulta(
@@ -125,19 +118,11 @@ class ConsultaService:
         fim: datetime,
         ignore_id: Optional[str] = None,
     ):
-        consultas = await asyncio.to_thread(self.repo.list_all)
-
-        for c in consultas:
-            # ignorar a própria consulta ao editar
-            if ignore_id and c.id == ignore_id:
-                continue
-
-            if c.medico_id != medico_id:
-                continue
-
-            # Checagem de sobreposição
-            if inicio < c.fim and fim > c.inicio:
-                raise ValueError(
-                    f"Conflito de agenda: Médico já possui consulta entre "
-                    f"{c.inicio} e {c.fim}"
-                )
+        # índice de intervalos do médico: busca binária em vez de varrer o histórico
+        conflito = await asyncio.to_thread(self.repo.find_conflict, medico_id, inicio, fim, ignore_id)
+        if conflito:
+            c_inicio, c_fim, _ = conflito
+            raise ValueError(
+                f"Conflito de agenda: Médico já possui consulta entre "
+                f"{c_inicio} e {c_fim}"
+            )
@@ -1,11 +1,13 @@
 import json
 import logging
-from ..infra.sse import sse_broker
+from ..infra.sse import TOPIC_AGENDA, sse_broker
 
 logger = logging.getLogger("event_service")
 
 async def enviar_evento_sse(tipo: str, dados: dict):
     msg = json.dumps({"tipo": tipo, "dados": dados})
-    logger.info(f"📡 Enviando evento SSE: tipo={tipo}, dados={dados}")
-    await sse_broker.publish(msg)
-    logger.info(f"✅ Evento SSE enviado com sucesso: {msg}")
\ No newline at end of file
+    # dados (ex.: medico_id) servem de filtro para os assinantes
+    await sse_broker.publish(TOPIC_AGENDA, msg, dados)
+    # em DEBUG: cada log também vira evento no stream de logs, o que
+    # dobraria o tráfego SSE em rajadas de reservas
+    logger.debug(f"📡 Evento SSE enviado: {msg}")
\ No newline at end of file
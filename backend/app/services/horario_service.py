@@ -2,13 +2,14 @@ from typing import List, Optional
 import logging
 from ..schemas.horario_schema import HorarioCreate, HorarioUpdate, HorarioOut
 from ..repositories.horario_repository import HorarioRepository
+from ..repositories.registry import get_horario_repository
 from ..services.event_service import enviar_evento_sse
 
 logger = logging.getLogger("horario_service")
 
 class HorarioService:
-    def __init__(self):
-        self.repo = HorarioRepository()
+    def __init__(self, repo: Optional[HorarioRepository] = None):
+        self.repo = repo or get_horario_repository()
 
     async def listar_todos_horarios(self) -> List[HorarioOut]:
         horarios = await self.repo.listar_todos_horarios()
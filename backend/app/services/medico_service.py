@@ -6,6 +6,7 @@ from uuid import uuid4
 
 from ..models.medico_model import Medico
 from ..repositories.medico_repository import MedicoRepository
+from ..repositories.registry import get_medico_repository
 from ..schemas.medico_schema import MedicoCreate, MedicoUpdate
 
 logger = logging.getLogger("medico_service")
@@ -13,7 +14,7 @@ logger = logging.getLogger("medico_service")
 
 class MedicoService:
     def __init__(self, repo: Optional[MedicoRepository] = None):
-        self.repo = repo or MedicoRepository()
+        self.repo = repo or get_medico_repository()
 
     async def listar_medicos(self) -> List[Medico]:
         logger.info("👨‍⚕️ Buscando lista de médicos no repositório")
@@ -33,17 +34,8 @@ class MedicoService:
     async def criar_medico(self, payload: MedicoCreate) -> Medico:
         now = datetime.utcnow()
         
-        # Gera ID auto-incremental
-        medicos_existentes = await asyncio.to_thread(self.repo.list_all)
-        max_id = 0
-        for m in medicos_existentes:
-            try:
-                mid = int(m.id)
-                if mid > max_id:
-                    max_id = mid
-            except ValueError:
-                continue
-        novo_id = str(max_id + 1)
+        # Gera ID auto-incremental (sequência persistida, atômica)
+        novo_id = await asyncio.to_thread(self.repo.next_id)
         
         medico = Medico(
             id=novo_id,
@@ -6,6 +6,7 @@ from uuid import uuid4
 
 from ..models.paciente_model import Paciente
 from ..repositories.paciente_repository import PacienteRepository
+from ..repositories.registry import get_paciente_repository
 from ..schemas.paciente_schema import PacienteCreate, PacienteUpdate
 
 logger = logging.getLogger("paciente_service")
@@ -13,7 +14,7 @@ logger = logging.getLogger("paciente_service")
 
 class PacienteService:
     def __init__(self, repository: Optional[PacienteRepository] = None) -> None:
-        self.repository = repository or PacienteRepository()
+        self.repository = repository or get_paciente_repository()
 
     async def listar_pacientes(self) -> List[Paciente]:
         logger.info("👥 Buscando lista de pacientes no repositório")
@@ -33,17 +34,8 @@ class PacienteService:
     async def criar_paciente(self, payload: PacienteCreate) -> Paciente:
         now = datetime.utcnow()
         
-        # Gera ID auto-incremental
-        pacientes_existentes = await asyncio.to_thread(self.repository.list_all)
-        max_id = 0
-        for p in pacientes_existentes:
-            try:
-                pid = int(p.id)
-                if pid > max_id:
-                    max_id = pid
-            except ValueError:
-                continue
-        novo_id = str(max_id + 1)
+        # Gera ID auto-incremental (sequência persistida, atômica)
+        novo_id = await asyncio.to_thread(self.repository.next_id)
         
         paciente = Paciente(
             id=novo_id,
@@ -2,9 +2,7 @@ from fpdf import FPDF # type: ignore
 from datetime import datetime
 from pathlib import Path
 from ..core.config import settings
-from ..repositories.consulta_repository import ConsultaRepository
-from ..repositories.medico_repository import MedicoRepository
-from ..repositories.paciente_repository import PacienteRepository
+from ..repositories.registry import get_consulta_repository, get_medico_repository, get_paciente_repository
 import logging
 import os
 
@@ -52,19 +50,19 @@ class RelatorioService:
 
     def gerar_relatorio(self, filtros: dict) -> str:
         logger.info(f"📊 Iniciando geração de relatório com filtros: {filtros}")
-        repo = ConsultaRepository()
-        medico_repo = MedicoRepository()
-        paciente_repo = PacienteRepository()
-        consultas = repo.list_all()
-        logger.info(f"📋 {len(consultas)} consultas carregadas do banco")
-
+        repo = get_consulta_repository()
+        medico_repo = get_medico_repository()
+        paciente_repo = get_paciente_repository()
         medico_id = filtros.get("medico_id")
         periodo_inicio = filtros.get("periodo_inicio")
         periodo_fim = filtros.get("periodo_fim")
 
+        # com médico no filtro, carrega só as consultas dele (índice por medico_id)
+        consultas = repo.list_by_medico(medico_id) if medico_id else repo.list_all()
+        logger.info(f"📋 {len(consultas)} consultas carregadas do banco")
+
         medico_nome = "Todos"
         if medico_id:
-            consultas = [c for c in consultas if c.medico_id == medico_id]
             logger.info(f"🔍 Filtrado por médico ID={medico_id}: {len(consultas)} consultas")
             medico = medico_repo.get_by_id(medico_id)
             if medico:
@@ -0,0 +1,164 @@
+"""
+Benchmark da checagem de conflito de agenda (ConsultaService._validar_conflito).
+
+Compara a varredura linear antiga (todas as consultas de todos os médicos)
+com o IntervalIndex por médico, em memória, sem I/O de arquivo.
+
+Depois mede o caminho real de reserva pelo ConsultaRepository (storage de
+STORAGE_ENGINE numa pasta temporária): checagem + gravação intercaladas,
+com o índice mantido pelas próprias escritas, contra a varredura linear
+sobre list_all() que a checagem fazia antes.
+
+Uso (na pasta backend):
+    python -m benchmarks.bench_conflito [--consultas 100000] [--medicos 50] [--historico 5000]
+"""
+import argparse
+import random
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from time import perf_counter
+
+from app.core.config import settings
+from app.infra.interval_index import IntervalIndex
+from app.models.consulta_model import Consulta
+
+
+def gerar_consultas(total: int, medicos: int) -> list:
+    base = datetime(2024, 1, 1, 8, 0)
+    consultas = []
+    for i in range(total):
+        medico_id = str(i % medicos)
+        # slots de 30 min sem sobreposição dentro do mesmo médico
+        inicio = base + timedelta(minutes=30 * (i // medicos))
+        consultas.append(
+            Consulta(
+                id=str(i + 1),
+                paciente_id=str(random.randint(1, 1000)),
+                medico_id=medico_id,
+                inicio=inicio,
+                fim=inicio + timedelta(minutes=30),
+                status="agendada",
+                observacoes=None,
+                created_at=base,
+                updated_at=base,
+            )
+        )
+    return consultas
+
+
+def conflito_linear(consultas, medico_id, inicio, fim):
+    # lógica original de _validar_conflito
+    for c in consultas:
+        if c.medico_id != medico_id:
+            continue
+        if inicio < c.fim and fim > c.inicio:
+            return c
+    return None
+
+
+def caminho_reserva(historico: int, medicos: int, reservas: int) -> None:
+    """Reserva + checagem pelo repositório, como em ConsultaService."""
+    settings.BASE_DIR = Path(tempfile.mkdtemp(prefix="bench_conflito_"))
+    from app.repositories.consulta_repository import ConsultaRepository
+
+    repo = ConsultaRepository()
+    consultas = gerar_consultas(historico, medicos)
+    repo.save_many(consultas)
+    proximo = len(consultas) + 1
+    base = datetime(2024, 1, 1, 8, 0)
+    # metade dos períodos cai depois do histórico: boa parte vira reserva
+    passos = 2 * int((max(c.fim for c in consultas) - base).total_seconds() // 900)
+
+    chamadas = {"find_by": 0}
+    find_by = repo.storage.find_by
+
+    def contar_find_by(*args, **kwargs):
+        chamadas["find_by"] += 1
+        return find_by(*args, **kwargs)
+
+    repo.storage.find_by = contar_find_by
+
+    random.seed(7)
+    t_index = t_linear = t_save = 0.0
+    gravadas = 0
+    for _ in range(reservas):
+        medico_id = str(random.randrange(medicos))
+        inicio = base + timedelta(minutes=15 * random.randint(0, passos))
+        fim = inicio + timedelta(minutes=30)
+
+        t0 = perf_counter()
+        conflito = repo.find_conflict(medico_id, inicio, fim)
+        t_index += perf_counter() - t0
+
+        t0 = perf_counter()
+        linear = conflito_linear(repo.list_all(), medico_id, inicio, fim)
+        t_linear += perf_counter() - t0
+        assert (conflito is None) == (linear is None), "resultados divergentes"
+
+        if conflito is None:
+            nova = Consulta(
+                id=str(proximo), paciente_id="1", medico_id=medico_id, inicio=inicio, fim=fim,
+                status="agendada", observacoes=None, created_at=base, updated_at=base,
+            )
+            proximo += 1
+            gravadas += 1
+            t0 = perf_counter()
+            repo.save(nova)
+            t_save += perf_counter() - t0
+
+    print()
+    print(f"caminho de reserva ({settings.STORAGE_ENGINE}): {historico} consultas, {gravadas}/{reservas} gravadas")
+    print(f"checagem (índice):   {t_index / reservas * 1000:10.3f} ms/reserva")
+    print(f"checagem (list_all): {t_linear / reservas * 1000:10.3f} ms/reserva")
+    print(f"gravação:            {t_save / max(gravadas, 1) * 1000:10.3f} ms/gravação")
+    print(f"releituras find_by:  {chamadas['find_by']:10d} (uma por médico, não por reserva)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--consultas", type=int, default=100_000)
+    parser.add_argument("--medicos", type=int, default=50)
+    parser.add_argument("--checagens", type=int, default=200)
+    parser.add_argument("--historico", type=int, default=5_000)
+    parser.add_argument("--reservas", type=int, default=200)
+    args = parser.parse_args()
+
+    consultas = gerar_consultas(args.consultas, args.medicos)
+    fim_historico = max(c.fim for c in consultas)
+
+    t0 = perf_counter()
+    index = IntervalIndex()
+    index.load((c.medico_id, c.id, c.inicio, c.fim) for c in consultas)
+    t_build = perf_counter() - t0
+
+    # períodos aleatórios de 30 min (passo de 15 min): metade cai em conflito
+    random.seed(42)
+    base = datetime(2024, 1, 1, 8, 0)
+    passos = int((fim_historico - base).total_seconds() // 900)
+    consultas_teste = []
+    for _ in range(args.checagens):
+        inicio = base + timedelta(minutes=15 * random.randint(0, passos))
+        consultas_teste.append((str(random.randrange(args.medicos)), inicio, inicio + timedelta(minutes=30)))
+
+    t0 = perf_counter()
+    r_linear = [conflito_linear(consultas, m, i, f) is not None for m, i, f in consultas_teste]
+    t_linear = perf_counter() - t0
+
+    t0 = perf_counter()
+    r_index = [index.find_overlap(m, i, f) is not None for m, i, f in consultas_teste]
+    t_index = perf_counter() - t0
+
+    assert r_linear == r_index, "resultados divergentes"
+
+    print(f"{args.consultas} consultas, {args.medicos} médicos, {args.checagens} checagens")
+    print(f"montagem do índice:  {t_build * 1000:10.1f} ms (uma vez)")
+    print(f"varredura linear:    {t_linear / args.checagens * 1000:10.3f} ms/checagem")
+    print(f"IntervalIndex:       {t_index / args.checagens * 1000:10.3f} ms/checagem")
+    print(f"ganho:               {t_linear / t_index:10.0f}x")
+
+    caminho_reserva(args.historico, args.medicos, args.reservas)
+
+
+if __name__ == "__main__":
+    main()
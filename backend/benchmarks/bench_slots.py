@@ -0,0 +1,100 @@
+"""
+Benchmark da montagem de slots de GET /agenda/slots para horizontes longos.
+
+Compara, com o cache frio, a montagem dia a dia em Python (datetime e
+isoformat por slot) com a geração vetorizada em polars, e confere que as
+duas dão exatamente o mesmo resultado (inclusive a ordem dos slots).
+
+Uso (na pasta backend):
+    python -m benchmarks.bench_slots [--medicos 50] [--consultas 5000] [--dias 90 365]
+"""
+import argparse
+import random
+from datetime import date, datetime, timedelta
+from time import perf_counter
+from types import SimpleNamespace
+
+from app.infra import slot_cache
+from app.infra.slot_cache import SlotCache
+from app.models.consulta_model import Consulta
+from app.models.horario_model import Horario
+
+DIAS_UTEIS = ("segunda", "terca", "quarta", "quinta", "sexta")
+
+
+def gerar_dados(medicos: int, consultas: int):
+    horarios = [
+        Horario(id=f"{m}-{d}", medico_id=str(m), dia_semana=d, hora_inicio="08:00", hora_fim="18:00")
+        for m in range(medicos)
+        for d in DIAS_UTEIS
+    ]
+    hoje = date.today()
+    lista = []
+    for i in range(consultas):
+        dia = hoje + timedelta(days=random.randrange(365))
+        inicio = datetime(dia.year, dia.month, dia.day, random.randint(8, 17), random.choice((0, 30)))
+        lista.append(
+            Consulta(
+                id=str(i + 1),
+                paciente_id="1",
+                medico_id=str(random.randrange(medicos)),
+                inicio=inicio,
+                fim=inicio + timedelta(minutes=30),
+                status="agendada",
+                observacoes=None,
+                created_at=inicio,
+                updated_at=inicio,
+            )
+        )
+    storage = SimpleNamespace(version=lambda: 0)
+    horario_repo = SimpleNamespace(list_all=lambda: horarios, storage=storage)
+    consulta_repo = SimpleNamespace(list_all=lambda: lista, storage=storage)
+    return horario_repo, consulta_repo
+
+
+def medir(horario_repo, consulta_repo, inicio: date, fim: date, vetorizado: bool):
+    min_dias = slot_cache.VECTOR_MIN_DAYS
+    if not vetorizado:
+        slot_cache.VECTOR_MIN_DAYS = 10**9
+    try:
+        cache = SlotCache()
+        cache.ensure_loaded(horario_repo, consulta_repo)
+        t0 = perf_counter()
+        result = cache.slots(inicio, fim)
+        return result, perf_counter() - t0
+    finally:
+        slot_cache.VECTOR_MIN_DAYS = min_dias
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--medicos", type=int, default=50)
+    parser.add_argument("--consultas", type=int, default=5000)
+    parser.add_argument("--dias", type=int, nargs="+", default=[90, 365])
+    args = parser.parse_args()
+
+    if slot_cache.pl is None:
+        raise SystemExit("polars não instalado: só o caminho em Python está disponível")
+
+    random.seed(42)
+    horario_repo, consulta_repo = gerar_dados(args.medicos, args.consultas)
+    hoje = date.today()
+    # primeira chamada ao polars paga a inicialização; fora da medição
+    medir(horario_repo, consulta_repo, hoje, hoje + timedelta(days=slot_cache.VECTOR_MIN_DAYS), True)
+
+    print(f"{args.medicos} médicos, {args.consultas} consultas (cache frio)")
+    for dias in args.dias:
+        fim = hoje + timedelta(days=dias - 1)
+        r_python, t_python = medir(horario_repo, consulta_repo, hoje, fim, False)
+        r_vetor, t_vetor = medir(horario_repo, consulta_repo, hoje, fim, True)
+        assert r_python == r_vetor, "resultados divergentes"
+        assert all(list(r_python[m]) == list(r_vetor[m]) for m in r_python), "ordem divergente"
+        total = sum(len(s) for s in r_python.values())
+        print(
+            f"{dias:4d} dias, {total:7d} slots:  python {t_python * 1000:8.1f} ms   "
+            f"polars {t_vetor * 1000:8.1f} ms   ganho {t_python / t_vetor:4.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,12 @@ export const Logs = () => {
             setLogs((prev) => [event.data, ...prev]);
         };
 
+        // Modo lote: vários logs num frame só (lista JSON, do mais antigo ao mais novo)
+        eventSource.addEventListener('lote', (event) => {
+            const itens = JSON.parse((event as MessageEvent).data) as string[];
+            setLogs((prev) => [...itens.reverse(), ...prev]);
+        });
+
         eventSource.onerror = () => {
             console.error('Erro no stream de logs');
             eventSource.close();
@@ -9,6 +9,7 @@ interface AgendaStore {
   error: string | null;
   selectedSlot: { medicoId: string; datetime: string } | null;
   eventSource: EventSource | null;
+  lastEventId: string | null;
   fetchSlots: (days?: number) => Promise<void>;
   getSlotStatus: (medicoId: string, datetime: string) => SlotStatus;
   reservarSlot: (medicoId: string, datetime: string) => Promise<boolean>;
@@ -26,6 +27,7 @@ export const useAgendaStore = create<AgendaStore>((set, get) => ({
   error: null,
   selectedSlot: null,
   eventSource: null,
+  lastEventId: null,
 
   fetchSlots: async (days = 7) => {
     set({ loading: true, error: null });
@@ -112,9 +114,21 @@ export const useAgendaStore = create<AgendaStore>((set, get) => ({
     }
 
     const baseURL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
-    const es = new EventSource(`${baseURL}/sistema/agenda/stream`);
+    // Ao reconectar, pede ao servidor os eventos perdidos desde o último recebido
+    const { lastEventId } = get();
+    const query = lastEventId ? `?last_event_id=${encodeURIComponent(lastEventId)}` : '';
+    const es = new EventSource(`${baseURL}/sistema/agenda/stream${query}`);
+    
+    // Servidor não tem mais os eventos perdidos: recarrega os slots
+    es.addEventListener('resync', () => {
+      console.log('🔄 SSE resync: reloading slots');
+      get().fetchSlots();
+    });
     
     es.onmessage = (event) => {
+      if (event.lastEventId) {
+        set({ lastEventId: event.lastEventId });
+      }
       try {
         console.log('📨 SSE Raw Event Data:', event.data);
         
@@ -193,6 +207,14 @@ export const useAgendaStore = create<AgendaStore>((set, get) => ({
       }
     };
     
+    // Modo lote: vários eventos num frame só; processa cada um como mensagem
+    es.addEventListener('lote', (event) => {
+      const { data, lastEventId } = event as MessageEvent;
+      (JSON.parse(data) as string[]).forEach((item) => {
+        es.onmessage?.(new MessageEvent('message', { data: item, lastEventId }));
+      });
+    });
+    
     es.onerror = () => {
       console.error('Erro na conexão SSE. Reconectando...');
       es.close();